@@ -21,6 +21,14 @@
       if(imgEl && post.image){
         const hero = post.hero || post.image;
         const thumb = post.thumb || post.image;
+        // Paint the precomputed placeholder (tools/process_images.py) until the hero arrives
+        if(post.width && post.height){ imgEl.width = post.width; imgEl.height = post.height; }
+        if(post.lqip || post.color){
+          imgEl.style.backgroundColor = post.color || '';
+          if(post.lqip) imgEl.style.backgroundImage = `url("${post.lqip}")`;
+          imgEl.style.backgroundSize = 'cover';
+          imgEl.addEventListener('load', () => { imgEl.style.backgroundImage = ''; imgEl.style.backgroundColor = ''; }, { once: true });
+        }
         imgEl.src = hero || thumb || post.image;
         imgEl.alt = post.title || imgEl.alt || '';
         const srcset = [];
@@ -29,6 +37,8 @@
         if(post.image) srcset.push(`${post.image} 400w`);
         if(srcset.length) imgEl.srcset = srcset.join(', ');
         if(!imgEl.sizes) imgEl.sizes = '(min-width:1600px) 1600px, (min-width:1000px) 1000px, 100vw';
+        // Already loaded (cached, or the same src as the markup): no load event will clear the placeholder
+        if(imgEl.complete && imgEl.naturalWidth){ imgEl.style.backgroundImage = ''; imgEl.style.backgroundColor = ''; }
       }
 
       // If post has map and a global initMap exists, show the map container then init
@@ -83,12 +83,53 @@ async function tryUpdateDeadlines() {
   if (changed) saveAwards();
 }
 
-// startup
+// startup (tools/update_deadlines.py does the same job offline, concurrently and with conditional requests)
 loadAwards();
 tryUpdateDeadlines().catch(err => console.error(err));
 // run every 12 hours
 setInterval(() => tryUpdateDeadlines().catch(err => console.error(err)), 12 * 60 * 60 * 1000);
 
+// Serve the .br/.gz siblings written by tools/precompress.py when the client accepts them,
+// so static text assets are not recompressed on every request. A sibling older than its
+// source is stale (the tools rewrite JSON and pages without recompressing) and is ignored.
+const PRECOMPRESSED = [['br', '.br'], ['gzip', '.gz']];
+function acceptedEncodings(header) {
+  // "br;q=0, gzip" -> Map { br => 0, gzip => 1 }
+  const q = new Map();
+  for (const part of (header || '').split(',')) {
+    const [name, ...params] = part.trim().toLowerCase().split(';');
+    if (!name) continue;
+    const qParam = params.map(p => p.trim()).find(p => p.startsWith('q='));
+    const value = qParam ? parseFloat(qParam.slice(2)) : 1;
+    q.set(name, Number.isNaN(value) ? 0 : value);
+  }
+  return encoding => (q.has(encoding) ? q.get(encoding) : (q.get('*') || 0)) > 0;
+}
+function servePrecompressed(root) {
+  return (req, res, next) => {
+    if (req.method !== 'GET' && req.method !== 'HEAD') return next();
+    const accepts = acceptedEncodings(req.headers['accept-encoding']);
+    let rel;
+    try { rel = decodeURIComponent(req.path); } catch (e) { return next(); }
+    if (rel.endsWith('/')) rel += 'index.html';
+    const file = path.join(root, rel);
+    if (!file.startsWith(root + path.sep)) return next();
+    let source;
+    try { source = fs.statSync(file); } catch (e) { return next(); }
+    for (const [encoding, suffix] of PRECOMPRESSED) {
+      if (!accepts(encoding)) continue;
+      let sibling;
+      try { sibling = fs.statSync(file + suffix); } catch (e) { continue; }
+      if (sibling.mtimeMs < source.mtimeMs) continue;
+      res.set('Content-Encoding', encoding);
+      res.set('Vary', 'Accept-Encoding');
+      res.type(path.extname(file));
+      return res.sendFile(file + suffix);
+    }
+    next();
+  };
+}
+
 // ensure folders exist
 const uploadsDir = path.join(__dirname, 'uploads');
 const dataDir = path.join(__dirname, 'data');
@@ -100,6 +141,7 @@ app.use(express.json({ limit: '10mb' }));
 
 // serve uploaded images and static frontend
 app.use('/uploads', express.static(uploadsDir));
+app.use(servePrecompressed(__dirname));
 app.use(express.static(__dirname));
 
 // mount routes
@@ -119,9 +161,3 @@ app.get('/api/awards', (req, res) => {
 app.listen(PORT, () => {
   console.log(`Photowards server listening on http://0.0.0.0:${PORT}`);
 });
-
-// Initial load and first update
-loadAwards();
-tryUpdateDeadlines().catch(err => console.error(err));
-// Schedule periodic updates (every 12 hours)
-setInterval(() => tryUpdateDeadlines().catch(err => console.error(err)), 12 * 60 * 60 * 1000);
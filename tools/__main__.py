@@ -0,0 +1,109 @@
+"""
+Single entry point for the site tools.
+
+Run from the repo root:
+  python tools <command> [options]
+  python tools --timings validate --no-dimensions
+
+Commands:
+  add          add a new image and post               (tools/add_image.py)
+  pipeline     watermark + resize + encode in-process (tools/pipeline.py)
+  process      generate thumbnails / webp variants    (tools/process_images.py)
+  watermark    batch watermark a folder               (tools/watermark.py)
+  validate     preflight validator                    (tools/ci_validate.py)
+  links        local link checker                     (tools/link_check.py)
+  normalize    slugify image filenames                (tools/normalize_filenames.py)
+  fix-posts    repair post HTML files                 (tools/fix_posts.py)
+  precompress  write .gz/.br siblings for text assets (tools/precompress.py)
+  build        fingerprinted, critical-CSS site build (tools/build_site.py)
+  deadlines    refresh award deadlines in awards.json (tools/update_deadlines.py)
+  feeds        sitemap, RSS/JSON feeds, search index  (tools/build_feeds.py)
+  posts        date queries, sorting, archive shards  (tools/post_index.py)
+  meta         EXIF/XMP metadata -> blog-posts.json   (tools/image_meta.py)
+  regen        resumable/sharded thumbnail rebuild    (tools/regenerate_thumbs_all.py)
+  sprites      pack thumbnails into sprite sheets     (tools/build_sprites.py)
+
+Each command's module is imported only when that command runs, so light commands
+(validate, links) never pay for Pillow or the process pool. Everything runs in this
+interpreter; no tool shells out to another `python`.
+
+`--timings` prints how long it took to get from interpreter start to the command's
+main() (interpreter boot + argument parsing + lazy import) and the total run time.
+"""
+import sys
+import time
+
+# name -> (module, help)
+COMMANDS = {
+    'add': ('add_image', 'add a new image and post'),
+    'pipeline': ('pipeline', 'watermark, resize and encode images in one pass'),
+    'process': ('process_images', 'generate thumbnails and webp variants'),
+    'watermark': ('watermark', 'batch watermark a folder of images'),
+    'validate': ('ci_validate', 'validate posts/blog-posts.json and referenced files'),
+    'links': ('link_check', 'check local links in HTML files'),
+    'normalize': ('normalize_filenames', 'slugify filenames in blog-images/'),
+    'fix-posts': ('fix_posts', 'repair post HTML files'),
+    'precompress': ('precompress', 'write .gz/.br siblings for static text assets'),
+    'build': ('build_site', 'build a fingerprinted, critical-CSS-inlined copy of the site into dist/'),
+    'deadlines': ('update_deadlines', 'refresh award deadlines in awards.json'),
+    'feeds': ('build_feeds', 'generate sitemap.xml, feed.xml, feed.json and search-index.json'),
+    'posts': ('post_index', 'query posts by date, keep them sorted, write per-year archive shards'),
+    'meta': ('image_meta', 'extract EXIF/XMP metadata and fill hasMap/mapCoordinates in blog-posts.json'),
+    'regen': ('regenerate_thumbs_all', 'regenerate every thumbnail from its original (checkpointed, shardable)'),
+    'sprites': ('build_sprites', 'pack thumbnails into sprite sheets and record offsets in blog-posts.json'),
+}
+
+
+def _process_start():
+    # Interpreter start time, so the reported startup includes Python's own boot and site imports.
+    # Falls back to "now" on platforms where /proc is not available.
+    try:
+        import os
+        with open('/proc/self/stat') as fh:
+            start_ticks = int(fh.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as fh:
+            uptime = float(fh.read().split()[0])
+        return time.time() - (uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+    except Exception:
+        return time.time()
+
+
+def usage():
+    lines = ['usage: python tools [--timings] <command> [options]', '', 'commands:']
+    for name, (_, help_text) in COMMANDS.items():
+        lines.append(f'  {name:<12} {help_text}')
+    return '\n'.join(lines)
+
+
+def main(argv):
+    entered = time.time()
+    timings = False
+    if argv and argv[0] == '--timings':
+        timings = True
+        argv = argv[1:]
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        return 0 if argv else 1
+    name, rest = argv[0], argv[1:]
+    if name not in COMMANDS:
+        print(f'Unknown command: {name}\n')
+        print(usage())
+        return 1
+
+    import importlib
+    module = importlib.import_module(COMMANDS[name][0])
+    ready = time.time()
+    try:
+        rc = module.main(rest)
+    except SystemExit as e:
+        rc = e.code
+    if timings:
+        started = _process_start()
+        print(f'[timings] startup {(ready - started) * 1000:.1f} ms '
+              f'(import {name}: {(ready - entered) * 1000:.1f} ms), total {(time.time() - started) * 1000:.1f} ms',
+              file=sys.stderr)
+    return rc or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -5,9 +5,16 @@ Add a new blog image and post.
 This script implements the flow:
  1. take a source image (pasted into `blog-images` or provided path)
  2. normalize/slugify the filename (avoid numeric suffixes where possible)
- 3. watermark the original into `blog-images/<name>` using `tools/watermark.py`
- 4. add a post entry to `posts/blog-posts.json` with today's published date
- 5. run `tools/process_images.py --file <name>` to create thumbnails and update JSON
+ 3. watermark the original into `blog-images/<name>` and render thumbnails from the same
+    decoded image (`tools/pipeline.py`, no intermediate copies or subprocesses)
+ 4. add a post entry to `posts/blog-posts.json` with today's published date, keeping the
+    list in date order, and refresh the per-year archive shards in `posts/archive/` and the
+    sitemap, feeds and search index (`tools/build_feeds.py`)
+ 5. point the post's thumb/hero at the generated thumbnails
+
+The post JSON (and its .bak), the archive shards, the feeds and the post page are committed together in
+one transaction (tools/atomicio.py): a crash or Ctrl-C leaves either all of them or none of
+them, and a commit interrupted midway is finished by the next run.
 
 Usage examples:
   python tools/add_image.py --src blog-images/new-photo.jpg
@@ -19,12 +26,21 @@ import argparse
 import json
 import os
 import re
-import shutil
 import subprocess
 from datetime import datetime
 from pathlib import Path
 
+from atomicio import Transaction, recover
+from build_feeds import OUTPUTS
+from image_meta import MetaCache, apply_to_post
+from pipeline import run_pipeline
+from post_index import PostIndex, save_posts
+from process_images import apply_mapping, load_placeholder_cache
+from watermark import load_font
+
 ROOT = Path(__file__).resolve().parents[1]
+JOURNAL = ROOT / 'tools' / 'add-image-journal.json'
+SIZES = [1600, 800, 400]
 
 
 def slugify(name: str) -> str:
@@ -45,13 +61,6 @@ def load_posts():
     return data, p
 
 
-def save_posts(data, path: Path):
-    # backup
-    bak = path.parent / (path.name + '.bak')
-    bak.write_text(path.read_text(encoding='utf-8'), encoding='utf-8')
-    path.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding='utf-8')
-
-
 def find_conflict(slug: str, posts: list) -> bool:
     for p in posts:
         img = p.get('image')
@@ -63,14 +72,14 @@ def find_conflict(slug: str, posts: list) -> bool:
     return False
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument('--src', required=True, help='Source image path (relative to repo root)')
     parser.add_argument('--title', default=None, help='Optional title for the post (defaults to slugified filename)')
     parser.add_argument('--watermark-text', default='monoismore.com', help='Watermark text to apply')
     parser.add_argument('--watermark-size', type=int, default=32, help='Watermark font size')
     parser.add_argument('--force', action='store_true', help='Overwrite existing post/image if slug conflicts')
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     src_path = (ROOT / args.src).resolve()
     if not src_path.exists():
@@ -82,6 +91,10 @@ def main():
         print('Could not generate slug from filename')
         raise SystemExit(1)
 
+    # Finish a commit interrupted by a previous run before reading blog-posts.json
+    if recover(JOURNAL):
+        print('Finished an interrupted commit from', JOURNAL)
+
     # Determine dest filename and ensure extension is .jpg
     dest_name = f"{slug}.jpg"
     dest_path = ROOT / 'blog-images' / dest_name
@@ -91,25 +104,21 @@ def main():
         print(f'A post or image with slug "{slug}" already exists. Use --force to overwrite.')
         raise SystemExit(1)
 
-    # Copy source to a temp folder to apply watermark and to preserve original if needed
-    tmp_dir = ROOT / 'tools' / '_addimg_tmp'
-    if tmp_dir.exists():
-        shutil.rmtree(tmp_dir)
-    tmp_dir.mkdir(parents=True)
-    tmp_src = tmp_dir / src_path.name
-    shutil.copy2(src_path, tmp_src)
-
-    # Apply watermark to the file in-place into blog-images via tools/watermark.py
-    # watermark.py expects source folder and dest folder; we'll put a single file in tmp and dest to blog-images
+    # Watermark, resize and encode in one process: the source is decoded once, the watermarked
+    # master is written to blog-images/ and the thumbnails are rendered from the in-memory image.
     print('Watermarking and copying to', dest_path)
-    cmd = [
-        'python', str(ROOT / 'tools' / 'watermark.py'),
-        '--source', str(tmp_dir),
-        '--dest', str(ROOT / 'blog-images'),
-        '--text', args.watermark_text,
-        '--size', str(args.watermark_size)
-    ]
-    subprocess.check_call(cmd)
+    font = load_font(None, args.watermark_size)
+    meta_cache = MetaCache()
+    placeholder_cache = load_placeholder_cache()
+    source_meta = {}
+    placeholders = {}
+    mapping = run_pipeline([src_path], ROOT / 'blog-images', ROOT / 'blog-images' / 'thumbs',
+                           watermark_text=args.watermark_text, font=font, sizes=SIZES,
+                           names={src_path: dest_name}, workers=1,
+                           meta_cache=meta_cache, meta_out=source_meta,
+                           placeholder_cache=placeholder_cache, placeholder_out=placeholders)
+    meta_cache.save()
+    placeholder_cache.save()
 
     # Ensure the watermarked file exists
     if not dest_path.exists():
@@ -129,34 +138,45 @@ def main():
         'hero': f"../blog-images/thumbs/{slug}-1600.jpg"
     }
 
-    # Append and save
-    posts = posts_data.get('posts', [])
-    posts.insert(0, new_post)
-    posts_data['posts'] = posts
-    save_posts(posts_data, posts_path)
+    # Fill hasMap/mapCoordinates/captured/camera/lens from the original's EXIF/XMP
+    if source_meta.get(dest_name):
+        apply_to_post(new_post, source_meta[dest_name])
+
+    # LQIP, dominant colour and size, painted while the thumbnail/hero loads (computed by the pipeline
+    # from the decoded source)
+    if placeholders.get(dest_name):
+        new_post.update(placeholders[dest_name])
+
+    # Insert at its date position (newest first)
+    index = PostIndex(posts_data.get('posts', []))
+    index.insert(new_post)
+    posts_data['posts'] = index.posts
+
+    # Point thumb/hero at the variants generated above
+    print('Updating JSON with generated thumbnails')
+    apply_mapping(posts_data, mapping, SIZES)
+
+    with Transaction(JOURNAL) as txn:
+        save_posts(posts_data, txn, posts_path)
+
+        # Create post page from template (no-map template)
+        tmpl = ROOT / 'posts' / 'post-template.html'
+        if tmpl.exists():
+            tpl_text = tmpl.read_text(encoding='utf-8')
+            page_path = ROOT / 'posts' / f"{slug}.html"
+            # Minimal replacement: set <title> and the image src in template if placeholders exist
+            tpl_text = tpl_text.replace('{{TITLE}}', title)
+            tpl_text = tpl_text.replace('{{IMAGE}}', f"../blog-images/{dest_name}")
+            txn.write_text(page_path, tpl_text)
+            print('Created post page', page_path)
+        else:
+            print('Template not found; create a post manually at posts/%s.html' % slug)
     print('Added post to', posts_path)
 
-    # Create post page from template (no-map template)
-    tmpl = ROOT / 'posts' / 'post-template.html'
-    if tmpl.exists():
-        tpl_text = tmpl.read_text(encoding='utf-8')
-        page_path = ROOT / 'posts' / f"{slug}.html"
-        # Minimal replacement: set <title> and the image src in template if placeholders exist
-        tpl_text = tpl_text.replace('{{TITLE}}', title)
-        tpl_text = tpl_text.replace('{{IMAGE}}', f"../blog-images/{dest_name}")
-        page_path.write_text(tpl_text, encoding='utf-8')
-        print('Created post page', page_path)
-    else:
-        print('Template not found; create a post manually at posts/%s.html' % slug)
-
-    # Run process_images to generate thumbs and update posts JSON
-    print('Generating thumbnails and updating JSON')
-    proc_cmd = ['python', str(ROOT / 'tools' / 'process_images.py'), '--file', dest_name]
-    subprocess.check_call(proc_cmd)
-
     # Stage changes and provide next steps
-    subprocess.check_call(['git', 'add', 'blog-images', 'blog-images/thumbs', 'posts/blog-posts.json', f'posts/{slug}.html'])
-    print('\nDone. Staged new image, thumbs, post JSON and post HTML. Commit them with an appropriate message.')
+    subprocess.check_call(['git', 'add', 'blog-images', 'blog-images/thumbs', 'posts/blog-posts.json', 'posts/archive', f'posts/{slug}.html',
+                           *OUTPUTS])
+    print('\nDone. Staged new image, thumbs, post JSON, post HTML and feeds. Commit them with an appropriate message.')
 
 
 if __name__ == '__main__':
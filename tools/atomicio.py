@@ -0,0 +1,355 @@
+"""
+Small helpers for writing build outputs atomically.
+
+Every helper writes to a temporary file in the destination directory and then
+renames it over the target with `os.replace`, so readers (the static server,
+the validator, a concurrent tool run) never observe a half-written file.
+
+`Transaction` extends this to a batch of files that must change together (a JSON
+file and the images it references, a rename and every reference to it): outputs
+are staged, fsynced once per batch and renamed into place from a journal that
+lets an interrupted commit be finished, and an interrupted batch be resumed.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+
+def _default_mode() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def _temp_path(dest: Path, tag: str = '') -> Path:
+    # `tag` marks the files staged by one journal, so its leftovers can be found again
+    prefix = f'.{dest.name}.{tag}.' if tag else f'.{dest.name}.'
+    fd, tmp = tempfile.mkstemp(prefix=prefix, suffix='.tmp', dir=str(dest.parent))
+    os.close(fd)
+    # mkstemp creates 0600 files; keep the existing file's mode, or what a plain open() would give
+    try:
+        mode = dest.stat().st_mode & 0o777
+    except FileNotFoundError:
+        mode = _default_mode()
+    os.chmod(tmp, mode)
+    return Path(tmp)
+
+
+def _fsync_file(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _fsync_dir(path):
+    # Makes renames in `path` durable. Directories cannot be opened on Windows; skip it there
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_bytes(dest: Path, data: bytes, fsync=False):
+    """Write `data` to `dest` atomically. With `fsync`, the data and the rename are flushed to disk."""
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _temp_path(dest)
+    try:
+        with open(tmp, 'wb') as fh:
+            fh.write(data)
+            if fsync:
+                fh.flush()
+                os.fsync(fh.fileno())
+        os.replace(tmp, dest)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    if fsync:
+        _fsync_dir(dest.parent)
+
+
+def atomic_write_text(dest: Path, text: str, fsync=False):
+    atomic_write_bytes(dest, text.encode('utf-8'), fsync=fsync)
+
+
+def atomic_write_json(dest: Path, data, fsync=False):
+    atomic_write_text(dest, json.dumps(data, indent=2, ensure_ascii=False), fsync=fsync)
+
+
+def atomic_save_image(im, dest: Path, fsync=False, **save_kwargs):
+    """Encode a PIL image straight into a temp file next to `dest`, then rename it into place.
+
+    With `fsync`, the data and the rename are flushed to disk.
+    """
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _temp_path(dest)
+    try:
+        with open(tmp, 'wb') as fh:
+            im.save(fh, **save_kwargs)
+            if fsync:
+                fh.flush()
+                os.fsync(fh.fileno())
+        os.replace(tmp, dest)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    if fsync:
+        _fsync_dir(dest.parent)
+
+
+def _apply(ops, replay=False):
+    """Apply journal operations.
+
+    With `replay` (from `recover()`) it is safe to repeat: steps that already happened are
+    skipped, including a rename whose destination already exists, since that is the rename's
+    own result. A first commit checks its renames up front (`_check_renames`) instead.
+    """
+    for op, a, b in ops:
+        if op == 'write':
+            if os.path.exists(a):
+                os.replace(a, b)
+        elif op == 'rename':
+            # samefile: a case-only rename on a case-insensitive filesystem
+            if not replay or (os.path.exists(a) and (not os.path.exists(b) or os.path.samefile(a, b))):
+                os.replace(a, b)
+        elif op == 'remove':
+            Path(a).unlink(missing_ok=True)
+
+
+def _check_renames(ops):
+    """Raise FileExistsError if a rename in `ops` would overwrite a file (FileNotFoundError if its
+    source is missing), before anything is applied.
+
+    Earlier operations in the batch count: a destination vacated by a previous rename or remove
+    is free, one written or renamed to earlier in the batch is not.
+    """
+    created, vacated = set(), set()
+    for op, a, b in ops:
+        if op == 'rename':
+            if a not in created and (a in vacated or not os.path.exists(a)):
+                raise FileNotFoundError(f'Cannot rename missing {a}')
+            occupied = b in created or (os.path.exists(b) and b not in vacated)
+            if occupied and not (os.path.exists(a) and os.path.exists(b) and os.path.samefile(a, b)):
+                raise FileExistsError(f'Refusing to rename {a} over existing {b}')
+            created.discard(a)
+            vacated.add(a)
+        if op in ('write', 'rename'):
+            vacated.discard(b)
+            created.add(b)
+        elif op == 'remove':
+            created.discard(a)
+            vacated.add(a)
+
+
+def _op_dirs(ops):
+    dirs = set()
+    for op, a, b in ops:
+        dirs.add(os.path.dirname(a))
+        if b:
+            dirs.add(os.path.dirname(b))
+    return dirs
+
+
+def _remove_stale_temps(dirs, tag):
+    """Delete files staged under `tag` in `dirs` that never reached a commit. Returns the count."""
+    removed = 0
+    for d in dirs:
+        for tmp in Path(d).glob(f'.*.{tag}.*.tmp'):
+            tmp.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+
+def recover(journal: Path):
+    """Finish a commit that was interrupted after its journal was written.
+
+    Returns True if anything was replayed. Progress recorded for a resumable batch is kept.
+    """
+    journal = Path(journal)
+    try:
+        state = json.loads(journal.read_text(encoding='utf-8'))
+    except FileNotFoundError:
+        return False
+    ops = state.get('ops') or []
+    if ops:
+        _apply(ops, replay=True)
+        for d in _op_dirs(ops):
+            _fsync_dir(d)
+    if state.get('completed'):
+        if ops:
+            state['ops'] = []
+            atomic_write_json(journal, state, fsync=True)
+    else:
+        journal.unlink(missing_ok=True)
+    return bool(ops)
+
+
+class Transaction:
+    """Stage a batch of output files and commit them together.
+
+    Staged writes go to temp files next to their destinations and nothing is visible until
+    `commit()`, which fsyncs every staged file (one barrier per batch rather than one per file),
+    records the pending renames in the journal, renames everything into place and fsyncs the
+    directories. A run killed during the renames is finished by `recover()`, which runs when the
+    next Transaction opens the same journal; a run killed earlier leaves every destination
+    untouched. Without a journal the batch is still fsynced and renamed together, but an
+    interrupted commit cannot be replayed.
+
+A `rename()` onto a file that already exists (other than itself, e.g. a case-only rename on a
+case-insensitive filesystem) makes `commit()` raise FileExistsError before any staged file or
+rename is applied; only `recover()` treats an existing destination as a rename that already
+happened.
+
+    Staged files are named after the journal and every directory they are staged in is recorded
+    before the first file lands there, so a run killed mid-batch does not leave hidden temp
+    files behind: the next Transaction on the same journal deletes them.
+
+    For long batches, call `done(key, result)` after each unit of work: every `commit_every`
+    units the staged outputs are committed and the finished keys are kept in the journal, so a
+    restarted run can skip whatever is already in `completed`. `fingerprint` (e.g. the run's
+    options) discards progress that was recorded under different settings. Leaving the `with`
+    block normally commits the rest and removes the journal; an exception discards only the
+    uncommitted part of the batch.
+    """
+
+    def __init__(self, journal: Path = None, commit_every=None, fingerprint=None):
+        self.journal = Path(journal) if journal else None
+        self.commit_every = commit_every
+        self.fingerprint = fingerprint
+        self.completed = {}
+        self._ops = []
+        self._staged = {}
+        self._pending = {}
+        self._dirs = set()
+        self._tag = hashlib.sha1(str(self.journal.resolve()).encode('utf-8')).hexdigest()[:8] if self.journal else ''
+        if self.journal:
+            try:
+                prior = json.loads(self.journal.read_text(encoding='utf-8'))
+            except FileNotFoundError:
+                prior = {}
+            if recover(self.journal):
+                print('Finished an interrupted commit from', self.journal)
+            # Whatever is still staged after recover() belonged to a batch that never committed
+            removed = _remove_stale_temps(prior.get('dirs', []), self._tag)
+            if removed:
+                print(f'Removed {removed} temp file(s) left by an interrupted run')
+            try:
+                state = json.loads(self.journal.read_text(encoding='utf-8'))
+            except FileNotFoundError:
+                state = {}
+            if state.get('fingerprint') == fingerprint:
+                self.completed = state.get('completed', {})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.finish()
+        else:
+            self.rollback()
+        return False
+
+    def _stage(self, dest: Path) -> Path:
+        dest = Path(dest).resolve()
+        # A later write to the same destination replaces the earlier one
+        self._discard(dest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        if self.journal and str(dest.parent) not in self._dirs:
+            self._dirs.add(str(dest.parent))
+            self._write_journal([], self.completed)
+        tmp = _temp_path(dest, self._tag)
+        self._staged[dest] = tmp
+        self._ops.append(('write', str(tmp), str(dest)))
+        return tmp
+
+    def _discard(self, dest: Path):
+        tmp = self._staged.pop(dest, None)
+        if tmp is not None:
+            tmp.unlink(missing_ok=True)
+            self._ops = [op for op in self._ops if op[1] != str(tmp)]
+
+    def write_bytes(self, dest: Path, data: bytes):
+        tmp = self._stage(dest)
+        try:
+            tmp.write_bytes(data)
+        except BaseException:
+            self._discard(Path(dest).resolve())
+            raise
+
+    def write_text(self, dest: Path, text: str):
+        self.write_bytes(dest, text.encode('utf-8'))
+
+    def write_json(self, dest: Path, data):
+        self.write_text(dest, json.dumps(data, indent=2, ensure_ascii=False))
+
+    def save_image(self, im, dest: Path, **save_kwargs):
+        tmp = self._stage(dest)
+        try:
+            with open(tmp, 'wb') as fh:
+                im.save(fh, **save_kwargs)
+        except BaseException:
+            self._discard(Path(dest).resolve())
+            raise
+
+    def rename(self, src: Path, dst: Path):
+        self._ops.append(('rename', str(Path(src).resolve()), str(Path(dst).resolve())))
+
+    def remove(self, path: Path):
+        self._ops.append(('remove', str(Path(path).resolve()), None))
+
+    def done(self, key, result=None):
+        """Mark a unit of work finished; commits the batch every `commit_every` units."""
+        self._pending[key] = result
+        if self.commit_every and len(self._pending) >= self.commit_every:
+            self.commit()
+
+    def _write_journal(self, ops, completed):
+        if self.journal:
+            atomic_write_json(self.journal, {'fingerprint': self.fingerprint, 'completed': completed, 'ops': ops,
+                                             'dirs': sorted(self._dirs)}, fsync=True)
+
+    def commit(self):
+        # Before anything is applied: a conflict discards the batch and leaves every destination untouched
+        try:
+            _check_renames(self._ops)
+        except OSError:
+            self.rollback()
+            raise
+        ops, self._ops, self._staged = self._ops, [], {}
+        completed = {**self.completed, **self._pending}
+        if ops:
+            for tmp in {a for op, a, _ in ops if op == 'write'}:
+                _fsync_file(tmp)
+            for d in _op_dirs(ops):
+                _fsync_dir(d)
+            self._write_journal(ops, completed)
+            _apply(ops)
+            for d in _op_dirs(ops):
+                _fsync_dir(d)
+        if ops or self._pending:
+            self._write_journal([], completed)
+        self.completed, self._pending = completed, {}
+
+    def finish(self):
+        """Commit whatever is staged and drop the journal: the batch is complete."""
+        self.commit()
+        if self.journal:
+            self.journal.unlink(missing_ok=True)
+
+    def rollback(self):
+        """Discard staged outputs that were not committed yet."""
+        for tmp in self._staged.values():
+            tmp.unlink(missing_ok=True)
+        self._ops, self._staged, self._pending = [], {}, {}
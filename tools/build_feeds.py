@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Generate sitemap.xml, an RSS feed, a JSON Feed and a prebuilt search index from
+posts/blog-posts.json.
+
+Outputs (repo root, committed and served as-is by the static site):
+  sitemap.xml         every page and post, with <lastmod> from the post's published date
+  feed.xml            RSS 2.0, newest first
+  feed.json           JSON Feed 1.1, newest first
+  search-index.json   compact inverted index over post titles:
+                      {"version": 1, "posts": [[id, title, link, thumb], ...],
+                       "terms": {"token": [post index, ...], ...}}
+                      where `id` is the post's page slug (posts/<id>.html)
+
+The run is incremental: tools/feeds-stamp.json records a hash of blog-posts.json (plus the
+options), and nothing is rewritten unless the posts data changed or an output is missing.
+`post_index.save_posts` calls `write_feeds` in the same transaction as blog-posts.json, so every
+tool that rewrites the posts keeps the outputs current; run this by hand after editing the JSON.
+
+Usage:
+  python tools/build_feeds.py [--base-url https://monoismore.com] [--limit 50] [--force]
+"""
+import argparse
+import hashlib
+import json
+import re
+import sys
+from datetime import datetime, time, timezone
+from email.utils import format_datetime
+from html import escape as html_escape
+from pathlib import Path
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+import post_index
+from atomicio import Transaction
+
+ROOT = Path(__file__).resolve().parents[1]
+POSTS_JSON = ROOT / 'posts' / 'blog-posts.json'
+STAMP = ROOT / 'tools' / 'feeds-stamp.json'
+OUTPUTS = ('sitemap.xml', 'feed.xml', 'feed.json', 'search-index.json')
+
+# Bump when the output format changes so existing outputs are regenerated
+GENERATOR_VERSION = 1
+SITE_TITLE = 'Mono is More'
+SITE_DESCRIPTION = 'The B&W that Screams Colours — a black & white photography blog'
+STATIC_PAGES = ('index.html', 'contact.html', 'photowards.html')
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def parse_published(value):
+    """The post's published date as an aware UTC datetime at midnight (None if malformed)."""
+    d = post_index.parse_published(value)
+    return datetime.combine(d, time(), tzinfo=timezone.utc) if d else None
+
+
+def post_id(post):
+    return Path(post.get('link', '')).stem
+
+
+def site_url(base_url, ref):
+    """Absolute URL for a repo-relative ref such as `posts/x.html` or `../blog-images/x.jpg`."""
+    ref = ref.replace('\\', '/')
+    while ref.startswith(('../', './')):
+        ref = ref.split('/', 1)[1]
+    return f"{base_url}/{quote(ref.lstrip('/'))}"
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(text.lower()) if len(t) > 1]
+
+
+def img_html(url, alt):
+    return f'<img src="{html_escape(url)}" alt="{html_escape(alt)}">'
+
+
+def sorted_posts(posts):
+    """Newest first; undated posts last. Stable, so same-day posts keep their JSON order."""
+    return post_index.sort_posts(p for p in posts if p.get('link'))
+
+
+def build_sitemap(posts, base_url):
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+    newest = next((parse_published(p.get('published')) for p in posts if parse_published(p.get('published'))), None)
+    for page in STATIC_PAGES:
+        loc = f'{base_url}/' if page == 'index.html' else site_url(base_url, page)
+        lastmod = f'<lastmod>{newest.date().isoformat()}</lastmod>' if page == 'index.html' and newest else ''
+        lines.append(f'  <url><loc>{escape(loc)}</loc>{lastmod}</url>')
+    for p in posts:
+        d = parse_published(p.get('published'))
+        lastmod = f'<lastmod>{d.date().isoformat()}</lastmod>' if d else ''
+        lines.append(f"  <url><loc>{escape(site_url(base_url, p['link']))}</loc>{lastmod}</url>")
+    lines.append('</urlset>')
+    return '\n'.join(lines) + '\n'
+
+
+def build_rss(posts, base_url):
+    items = []
+    for p in posts:
+        url = escape(site_url(base_url, p['link']))
+        d = parse_published(p.get('published'))
+        parts = [f"<title>{escape(p.get('title', ''))}</title>", f'<link>{url}</link>',
+                 f'<guid isPermaLink="true">{url}</guid>']
+        if d:
+            parts.append(f'<pubDate>{format_datetime(d)}</pubDate>')
+        image = p.get('thumb') or p.get('image')
+        if image:
+            img_url = site_url(base_url, image)
+            parts.append(f'<description>{escape(img_html(img_url, p.get("title", "")))}</description>')
+            parts.append(f'<enclosure url="{html_escape(img_url)}" type="image/jpeg" length="0"/>')
+        items.append('    <item>' + ''.join(parts) + '</item>')
+    newest = next((parse_published(p.get('published')) for p in posts if parse_published(p.get('published'))), None)
+    head = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom">',
+        '  <channel>',
+        f'    <title>{escape(SITE_TITLE)}</title>',
+        f'    <link>{escape(base_url)}/</link>',
+        f'    <description>{escape(SITE_DESCRIPTION)}</description>',
+        f'    <atom:link href="{escape(base_url)}/feed.xml" rel="self" type="application/rss+xml"/>',
+    ]
+    if newest:
+        head.append(f'    <lastBuildDate>{format_datetime(newest)}</lastBuildDate>')
+    return '\n'.join(head + items + ['  </channel>', '</rss>']) + '\n'
+
+
+def build_json_feed(posts, base_url):
+    items = []
+    for p in posts:
+        url = site_url(base_url, p['link'])
+        item = {'id': url, 'url': url, 'title': p.get('title', '')}
+        d = parse_published(p.get('published'))
+        if d:
+            item['date_published'] = d.isoformat().replace('+00:00', 'Z')
+        if p.get('hero') or p.get('image'):
+            item['image'] = site_url(base_url, p.get('hero') or p.get('image'))
+        if p.get('thumb') or p.get('image'):
+            item['content_html'] = img_html(site_url(base_url, p.get('thumb') or p.get('image')), item['title'])
+        items.append(item)
+    return {
+        'version': 'https://jsonfeed.org/version/1.1',
+        'title': SITE_TITLE,
+        'home_page_url': f'{base_url}/',
+        'feed_url': f'{base_url}/feed.json',
+        'description': SITE_DESCRIPTION,
+        'items': items,
+    }
+
+
+def build_search_index(posts):
+    docs = []
+    terms = {}
+    for i, p in enumerate(posts):
+        docs.append([post_id(p), p.get('title', ''), p['link'], p.get('thumb') or p.get('image') or ''])
+        for tok in set(tokenize(p.get('title', ''))):
+            terms.setdefault(tok, []).append(i)
+    return {'version': 1, 'posts': docs, 'terms': dict(sorted(terms.items()))}
+
+
+def default_base_url():
+    """https:// + the CNAME, or the canonical domain if there is none."""
+    cname = ROOT / 'CNAME'
+    return 'https://' + cname.read_text(encoding='utf-8').strip() if cname.exists() else 'https://monoismore.com'
+
+
+def write_feeds(data, txn=None, out: Path = ROOT, base_url=None, limit=50, force=False):
+    """Stage the outputs for the posts in `data` in `txn`; returns False if they were already current.
+
+    The stamp key hashes `data` serialized the way blog-posts.json is written, so a call from
+    `post_index.save_posts` and a later `python tools feeds` agree on it.
+    """
+    if txn is None:
+        with Transaction() as txn:
+            return write_feeds(data, txn, out, base_url, limit, force)
+    base_url = (base_url or default_base_url()).rstrip('/')
+    raw = json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+    key = hashlib.sha256(raw + json.dumps([GENERATOR_VERSION, base_url, limit]).encode('utf-8')).hexdigest()
+    try:
+        stamp = json.loads(STAMP.read_text(encoding='utf-8'))
+    except Exception:
+        stamp = {}
+    if not force and stamp.get(str(out)) == key and all((out / name).exists() for name in OUTPUTS):
+        return False
+
+    posts = sorted_posts(data.get('posts', []))
+    txn.write_text(out / 'sitemap.xml', build_sitemap(posts, base_url))
+    txn.write_text(out / 'feed.xml', build_rss(posts[:limit], base_url))
+    txn.write_json(out / 'feed.json', build_json_feed(posts[:limit], base_url))
+    # Compact separators: this file is downloaded by every client that searches
+    txn.write_text(out / 'search-index.json', json.dumps(build_search_index(posts), ensure_ascii=False, separators=(',', ':')))
+
+    stamp[str(out)] = key
+    txn.write_json(STAMP, stamp)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate sitemap, feeds and search index from posts/blog-posts.json')
+    parser.add_argument('--base-url', default=None, help='Site URL (default: https:// + CNAME)')
+    parser.add_argument('--limit', type=int, default=50, help='Maximum items in the RSS/JSON feeds')
+    parser.add_argument('--out', default='.', help='Output directory relative to repo root')
+    parser.add_argument('--force', action='store_true', help='Regenerate even if blog-posts.json is unchanged')
+    args = parser.parse_args(argv)
+
+    out = ROOT / args.out
+    data = json.loads(POSTS_JSON.read_text(encoding='utf-8'))
+    if not write_feeds(data, out=out, base_url=args.base_url, limit=args.limit, force=args.force):
+        print('Posts unchanged since last run; feeds are up to date')
+        return 0
+    print(f'Wrote {", ".join(OUTPUTS)} for {len(sorted_posts(data.get("posts", [])))} post(s) to {out}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Build a deployable copy of the static site into `dist/`.
+
+Steps:
+ 1. fingerprint CSS/JS: `styles.css` -> `styles.<hash>.css`, `scripts/post-meta.js` ->
+    `scripts/post-meta.<hash>.js`, ... (first 10 hex chars of the sha256), and rewrite every
+    href/src in the HTML pages to the fingerprinted names, so they can be cached forever
+ 2. for each post page, inline the critical CSS (the rules of the linked stylesheets whose
+    selectors match elements in that page) in a <style> block and load the full stylesheets
+    without blocking render (preload + onload, with a <noscript> fallback)
+ 3. drop the OpenLayers include (`ol.js`) from posts whose `hasMap` is false in
+    posts/blog-posts.json
+ 4. copy (hard-link where possible) every other served file unchanged
+
+The source tree is never modified. dist/asset-manifest.json maps original asset paths to
+their fingerprinted names.
+
+Usage:
+  python tools/build_site.py [--out dist] [--no-critical]
+
+Then precompress the build output for server.js:
+  python tools precompress --root dist
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+from html.parser import HTMLParser
+from pathlib import Path
+
+from atomicio import atomic_write_json, atomic_write_text
+from precompress import SKIP_DIRS, SKIP_FILES
+
+ROOT = Path(__file__).resolve().parents[1]
+POSTS_JSON = ROOT / 'posts' / 'blog-posts.json'
+
+FINGERPRINT_EXT = ('.css', '.js')
+# Pages under posts/ that are templates rather than rendered posts
+TEMPLATES = {'post-template.html', 'post-template-has-map.html', 'post-template-no-map.html'}
+
+REF_RE = re.compile(r'''(<(?:link|script)\b[^>]*?\b(?:href|src)\s*=\s*)(["'])([^"']+)\2''', re.I)
+STYLESHEET_RE = re.compile(r'''<link\b(?=[^>]*\brel\s*=\s*["']stylesheet["'])[^>]*\bhref\s*=\s*["']([^"']+)["'][^>]*>''', re.I)
+OL_SCRIPT_RE = re.compile(r'''[ \t]*<script\b[^>]*\bsrc\s*=\s*["'][^"']*/ol\.js["'][^>]*>\s*</script>[ \t]*\n?''', re.I)
+OL_CSS_RE = re.compile(r'''[ \t]*<link\b[^>]*\bhref\s*=\s*["'][^"']*/ol\.css["'][^>]*>[ \t]*\n?''', re.I)
+
+
+def served_files(root: Path, out: Path):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames
+                             if d not in SKIP_DIRS and not d.startswith('.') and Path(dirpath, d) != out)
+        for f in sorted(filenames):
+            if f in SKIP_FILES or f.startswith('.') or f.endswith(('.gz', '.br', '.bak', '.md')) or f == 'Dockerfile':
+                continue
+            yield Path(dirpath) / f
+
+
+def fingerprint_name(path: Path, data: bytes):
+    digest = hashlib.sha256(data).hexdigest()[:10]
+    return f'{path.stem}.{digest}{path.suffix}'
+
+
+def resolve_ref(ref: str, page_dir: Path):
+    """Map an href/src value to a file under ROOT, or None for external/unresolvable refs."""
+    if ref.startswith(('http://', 'https://', '//', 'data:', 'mailto:', 'tel:', 'javascript:')):
+        return None
+    ref = ref.split('#', 1)[0].split('?', 1)[0]
+    if not ref:
+        return None
+    if ref.startswith('/'):
+        return (ROOT / ref.lstrip('/')).resolve()
+    return (page_dir / ref).resolve()
+
+
+# --- critical CSS -------------------------------------------------------------------------
+
+class _PageSymbols(HTMLParser):
+    """Collect the tag names, ids and classes present in a page."""
+
+    def __init__(self):
+        super().__init__()
+        self.tags, self.ids, self.classes = set(), set(), set()
+
+    def handle_starttag(self, tag, attrs):
+        self.tags.add(tag.lower())
+        for key, value in attrs:
+            if key == 'id' and value:
+                self.ids.add(value)
+            elif key == 'class' and value:
+                self.classes.update(value.split())
+
+
+def parse_css(css: str):
+    """Split a stylesheet into (prelude, body) blocks; nested at-rule bodies are left as raw text."""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    blocks = []
+    i, n = 0, len(css)
+    while i < n:
+        start = css.find('{', i)
+        if start == -1:
+            break
+        prelude = css[i:start].strip()
+        depth, j, quote = 1, start + 1, None
+        while j < n and depth:
+            c = css[j]
+            if quote:
+                if c == quote and css[j - 1] != '\\':
+                    quote = None
+            elif c in '"\'':
+                quote = c
+            elif c == '{':
+                depth += 1
+            elif c == '}':
+                depth -= 1
+            j += 1
+        # Statements without a block (e.g. @import ...;) end up in the prelude; keep the last one
+        prelude = prelude.rsplit(';', 1)[-1].strip()
+        blocks.append((prelude, css[start + 1:j - 1].strip()))
+        i = j
+    return blocks
+
+
+_PSEUDO_RE = re.compile(r'::?[a-zA-Z-]+(\([^)]*\))?|\[[^\]]*\]')
+_SIMPLE_RE = re.compile(r'([.#]?)(-?[_a-zA-Z][\w-]*)')
+
+
+def selector_matches(selector: str, symbols: _PageSymbols):
+    """Conservative check: every tag/id/class named in the selector exists somewhere in the page."""
+    selector = _PSEUDO_RE.sub('', selector)
+    for kind, name in _SIMPLE_RE.findall(selector):
+        if kind == '.' and name not in symbols.classes:
+            return False
+        if kind == '#' and name not in symbols.ids:
+            return False
+        if not kind and name.lower() not in symbols.tags:
+            return False
+    return True
+
+
+def critical_css(css: str, symbols: _PageSymbols):
+    out = []
+    keyframes = {}
+    for prelude, body in parse_css(css):
+        if prelude.startswith(('@media', '@supports')):
+            inner = critical_css(body, symbols)
+            if inner:
+                out.append(f'{prelude}{{{inner}}}')
+        elif prelude.startswith(('@keyframes', '@-webkit-keyframes')):
+            keyframes[prelude.split()[-1]] = f'{prelude}{{{body}}}'
+        elif prelude.startswith('@'):
+            # @font-face, @page, ...: cheap and needed as soon as anything renders
+            out.append(f'{prelude}{{{body}}}')
+        elif any(selector_matches(s, symbols) for s in prelude.split(',')):
+            out.append(f'{prelude}{{{body}}}')
+    text = ''.join(out)
+    # Only carry animations that a kept rule actually uses
+    text += ''.join(rule for name, rule in keyframes.items() if re.search(r'\b%s\b' % re.escape(name), text))
+    return re.sub(r'\s*\n\s*', '', text)
+
+
+def defer_stylesheets(html: str, critical: str):
+    """Inline `critical` where the first stylesheet was linked and turn the blocking links into async preloads.
+
+    The <style> takes the first link's place so later inline page styles still override it, as before.
+    """
+    inserted = False
+
+    def defer(m):
+        nonlocal inserted
+        href = m.group(1)
+        if href.startswith(('http://', 'https://', '//')):
+            return m.group(0)
+        tag = (f'<link rel="preload" href="{href}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'">'
+               f'<noscript><link rel="stylesheet" href="{href}"></noscript>')
+        if not inserted:
+            inserted = True
+            tag = f'<style>{critical}</style>\n    {tag}'
+        return tag
+    return STYLESHEET_RE.sub(defer, html)
+
+
+# --- build ----------------------------------------------------------------------------------
+
+def load_posts_by_page():
+    try:
+        data = json.loads(POSTS_JSON.read_text(encoding='utf-8'))
+    except Exception as e:
+        print('Could not read', POSTS_JSON, e)
+        return {}
+    return {os.path.basename(p['link']): p for p in data.get('posts', []) if p.get('link')}
+
+
+def build_page(path: Path, html: str, renames, posts_by_page, css_sources, inline_critical=True):
+    page_dir = path.parent
+
+    def rewrite(m):
+        target = resolve_ref(m.group(3), page_dir)
+        new_name = renames.get(target)
+        if not new_name:
+            return m.group(0)
+        ref = m.group(3)
+        return f'{m.group(1)}{m.group(2)}{ref[:ref.rfind(target.name)]}{new_name}{m.group(2)}'
+
+    is_post = page_dir == ROOT / 'posts' and path.name not in TEMPLATES
+    post = posts_by_page.get(path.name) if is_post else None
+
+    stylesheets = []
+    if is_post and inline_critical:
+        stylesheets = [resolve_ref(href, page_dir) for href in STYLESHEET_RE.findall(html)]
+        stylesheets = [p for p in stylesheets if p in css_sources]
+
+    if post is not None and not post.get('hasMap'):
+        html = OL_SCRIPT_RE.sub('', html)
+        html = OL_CSS_RE.sub('', html)
+
+    html = REF_RE.sub(rewrite, html)
+
+    if stylesheets:
+        symbols = _PageSymbols()
+        symbols.feed(html)
+        critical = ''.join(critical_css(css_sources[p], symbols) for p in stylesheets)
+        html = defer_stylesheets(html, critical)
+    return html
+
+
+def link_or_copy(src: Path, dest: Path):
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    dest.unlink(missing_ok=True)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build a fingerprinted, critical-CSS-inlined copy of the site')
+    parser.add_argument('--out', default='dist', help='Output directory relative to repo root (default: dist)')
+    parser.add_argument('--no-critical', dest='critical', action='store_false', help='Do not inline critical CSS')
+    args = parser.parse_args(argv)
+
+    out = (ROOT / args.out).resolve()
+    if out == ROOT or ROOT.is_relative_to(out):
+        print('Refusing to build into', out)
+        return 1
+    if out.exists():
+        shutil.rmtree(out)
+
+    files = list(served_files(ROOT, out))
+    # Fingerprint stylesheets and scripts first so every page can be rewritten against the final names
+    renames, css_sources, manifest = {}, {}, {}
+    for f in files:
+        if f.suffix.lower() not in FINGERPRINT_EXT:
+            continue
+        data = f.read_bytes()
+        new_name = fingerprint_name(f, data)
+        renames[f.resolve()] = new_name
+        if f.suffix.lower() == '.css':
+            css_sources[f.resolve()] = data.decode('utf-8')
+        rel = f.relative_to(ROOT)
+        manifest[rel.as_posix()] = rel.with_name(new_name).as_posix()
+        link_or_copy(f, out / rel.with_name(new_name))
+
+    posts_by_page = load_posts_by_page()
+    pages = 0
+    for f in files:
+        rel = f.relative_to(ROOT)
+        if f.suffix.lower() in FINGERPRINT_EXT:
+            continue
+        if f.suffix.lower() == '.html':
+            html = f.read_text(encoding='utf-8')
+            atomic_write_text(out / rel, build_page(f, html, renames, posts_by_page, css_sources, args.critical))
+            pages += 1
+        else:
+            link_or_copy(f, out / rel)
+
+    atomic_write_json(out / 'asset-manifest.json', dict(sorted(manifest.items())))
+    print(f'Built {pages} page(s) and {len(manifest)} fingerprinted asset(s) into {out}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
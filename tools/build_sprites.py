@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Pack the 800px thumbnails (or another generated size, `--size`) into a few sprite sheets for
+the home page grid.
+
+Posts are grouped in date order, oldest first, `--per-sheet` at a time, so a new post only
+ever changes the newest sheet. Each group is laid out by a skyline bottom-left rectangle
+packer (tallest thumbs first) into a roughly square sheet, with `--padding` px between thumbs
+so scaled backgrounds never bleed into a neighbour. Sheets are written to
+blog-images/sprites/sheet-NNN.jpg.
+
+blog-images/sprites/sprites.json records every sheet's members (thumb path -> sha256) and
+layout. A sheet is only re-encoded when its members or their content changed; the others keep
+their existing file and offsets.
+
+Each post gets a `sprite` entry in blog-posts.json:
+  {"sheet": "../blog-images/sprites/sheet-001.jpg?v=<hash>", "src": "blog-images/thumbs/<name>-800.jpg",
+   "x": 0, "y": 0, "w": 600, "h": 800, "sheetWidth": 2349, "sheetHeight": 2704}
+The `?v=` suffix changes whenever the sheet is rebuilt, so cached copies are not reused.
+The 800px thumbs are what the grid loads anyway (`thumb`), so at the default size a sheet
+replaces `--per-sheet` requests with one of fewer total bytes and is never blurrier than the
+tile's own thumb. With a smaller `--size`, index.html only uses a tile where it needs at most
+1.5x the sprite's pixels, and only fetches a sheet when most of its tiles pass that test at the
+current viewport; the other tiles keep loading their own thumb. Either way a sheet is only
+requested once one of its tiles nears the viewport; until then the tiles show the post's colour.
+
+The sheets, the manifest and the JSON are committed in one transaction (tools/atomicio.py).
+
+Usage:
+  python tools/build_sprites.py [--per-sheet 12] [--quality 85] [--size 800] [--force]
+"""
+import argparse
+import hashlib
+import io
+import json
+import math
+import sys
+from pathlib import Path
+
+from PIL import Image
+
+from atomicio import Transaction
+from post_index import save_posts, sort_posts
+
+ROOT = Path(__file__).resolve().parents[1]
+POSTS_JSON = ROOT / 'posts' / 'blog-posts.json'
+THUMBS_DIR = ROOT / 'blog-images' / 'thumbs'
+SPRITES_DIR = ROOT / 'blog-images' / 'sprites'
+MANIFEST = SPRITES_DIR / 'sprites.json'
+
+# Bump when the sheet layout or encoding changes so every sheet is rebuilt
+SPRITES_VERSION = 1
+
+
+def pack(sizes, width):
+    """Skyline bottom-left packing of (w, h) boxes into a strip `width` px wide.
+
+    Returns ([(x, y), ...] in input order, total height). Boxes are placed tallest first;
+    each goes where its top edge ends up lowest, leftmost on ties.
+    """
+    skyline = [[0, 0, width]]  # segments [x, y, w], left to right, covering the strip
+    positions = [None] * len(sizes)
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0], i))
+    for i in order:
+        w, h = sizes[i]
+        best = None
+        for start in range(len(skyline)):
+            x = skyline[start][0]
+            if x + w > width:
+                break
+            # The box rests on the highest segment it spans
+            y, covered, j = 0, 0, start
+            while covered < w:
+                y = max(y, skyline[j][1])
+                covered += skyline[j][2] if j > start else skyline[j][0] + skyline[j][2] - x
+                j += 1
+            if best is None or (y + h, x) < (best[1] + h, best[0]):
+                best = (x, y)
+        x, y = best
+        positions[i] = best
+
+        # Raise the skyline under the new box
+        top = y + h
+        new = []
+        for sx, sy, sw in skyline:
+            end = sx + sw
+            if end <= x or sx >= x + w:
+                new.append([sx, sy, sw])
+                continue
+            if sx < x:
+                new.append([sx, sy, x - sx])
+            if not new or new[-1][0] + new[-1][2] <= x:
+                new.append([x, top, w])
+            if end > x + w:
+                new.append([x + w, sy, end - x - w])
+        # Merge neighbours at the same height
+        skyline = []
+        for seg in new:
+            if skyline and skyline[-1][1] == seg[1]:
+                skyline[-1][2] += seg[2]
+            else:
+                skyline.append(seg)
+    height = max((positions[i][1] + sizes[i][1] for i in range(len(sizes))), default=0)
+    return positions, height
+
+
+def sheet_width(sizes):
+    # Aim for a square sheet; never narrower than the widest box
+    area = sum(w * h for w, h in sizes)
+    return max(max(w for w, _ in sizes), math.ceil(math.sqrt(area * 1.1)))
+
+
+def thumb_for(post, size=800):
+    """The post's `size` px thumb as (repo-relative path, Path), or None."""
+    img = post.get('image')
+    if not img:
+        return None
+    path = THUMBS_DIR / f'{Path(img).stem}-{size}.jpg'
+    return (path.relative_to(ROOT).as_posix(), path) if path.exists() else None
+
+
+def build_sheet(members, padding, quality):
+    """Pack and encode one sheet. `members` is [(rel, Path)]; returns (jpeg bytes, layout)."""
+    images = []
+    for rel, path in members:
+        with Image.open(path) as im:
+            images.append((rel, im.convert('RGB')))
+    sizes = [(im.width + padding, im.height + padding) for _, im in images]
+    width = sheet_width(sizes)
+    positions, height = pack(sizes, width)
+    sheet = Image.new('RGB', (width - padding, height - padding), (238, 238, 238))
+    rects = {}
+    for (rel, im), (x, y) in zip(images, positions):
+        sheet.paste(im, (x, y))
+        rects[rel] = [x, y, im.width, im.height]
+    buf = io.BytesIO()
+    sheet.save(buf, format='JPEG', quality=quality, optimize=True, progressive=True)
+    return buf.getvalue(), {'width': sheet.width, 'height': sheet.height, 'rects': rects}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pack thumbnails into sprite sheets for the home page')
+    parser.add_argument('--per-sheet', type=int, default=12, help='Thumbnails per sheet')
+    parser.add_argument('--size', type=int, default=800, help='Which generated thumbnail size to pack')
+    parser.add_argument('--padding', type=int, default=2, help='Gap between thumbnails (px)')
+    parser.add_argument('--quality', type=int, default=85, help='JPEG quality of the sheets')
+    parser.add_argument('--force', action='store_true', help='Rebuild every sheet')
+    args = parser.parse_args(argv)
+
+    data = json.loads(POSTS_JSON.read_text(encoding='utf-8'))
+    posts = data.get('posts', [])
+    try:
+        manifest = json.loads(MANIFEST.read_text(encoding='utf-8'))
+        if manifest.get('version') != SPRITES_VERSION:
+            manifest = {}
+    except FileNotFoundError:
+        manifest = {}
+    old_sheets = manifest.get('sheets', {})
+    params = [args.padding, args.quality, args.size]
+
+    # Oldest first, so adding a post only touches the last sheet
+    members = []
+    seen = set()
+    for post in reversed(sort_posts(posts)):
+        thumb = thumb_for(post, args.size)
+        if thumb and thumb[0] not in seen:
+            seen.add(thumb[0])
+            members.append(thumb)
+    groups = [members[i:i + args.per_sheet] for i in range(0, len(members), args.per_sheet)]
+
+    sheets = {}
+    rebuilt = 0
+    with Transaction(ROOT / 'tools' / 'sprites-journal.json') as txn:
+        for n, group in enumerate(groups, 1):
+            name = f'sheet-{n:03d}.jpg'
+            digests = {rel: hashlib.sha256(path.read_bytes()).hexdigest() for rel, path in group}
+            key = hashlib.sha256(json.dumps([params, list(digests.items())]).encode('utf-8')).hexdigest()[:10]
+            old = old_sheets.get(name)
+            if not args.force and old and old.get('key') == key and (SPRITES_DIR / name).exists():
+                sheets[name] = old
+                continue
+            jpeg, layout = build_sheet(group, args.padding, args.quality)
+            txn.write_bytes(SPRITES_DIR / name, jpeg)
+            sheets[name] = dict(layout, key=key, members=digests)
+            rebuilt += 1
+            print(f'Built {name}: {len(group)} thumbs, {layout["width"]}x{layout["height"]}, {len(jpeg) / 1024:.1f}KB')
+        for name in old_sheets:
+            if name not in sheets:
+                txn.remove(SPRITES_DIR / name)
+                print('Removed', name)
+
+        # Point every post at its sheet and offsets
+        where = {}
+        for name, sheet in sheets.items():
+            url = f'../{SPRITES_DIR.relative_to(ROOT).as_posix()}/{name}?v={sheet["key"]}'
+            for rel, (x, y, w, h) in sheet['rects'].items():
+                where[rel] = {'sheet': url, 'src': rel, 'x': x, 'y': y, 'w': w, 'h': h,
+                              'sheetWidth': sheet['width'], 'sheetHeight': sheet['height']}
+        changed = False
+        for post in posts:
+            thumb = thumb_for(post, args.size)
+            sprite = where.get(thumb[0]) if thumb else None
+            if post.get('sprite') != sprite:
+                if sprite:
+                    post['sprite'] = sprite
+                else:
+                    post.pop('sprite', None)
+                changed = True
+
+        if rebuilt or set(sheets) != set(old_sheets):
+            txn.write_json(MANIFEST, {'version': SPRITES_VERSION, 'sheets': sheets})
+        if changed:
+            save_posts(data, txn, POSTS_JSON)
+            print('Updated', POSTS_JSON)
+
+    print(f'{len(sheets)} sheet(s) for {len(members)} thumbnail(s); {rebuilt} rebuilt')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -7,30 +7,44 @@ Checks performed:
 - Warns about filenames containing spaces or uppercase letters
 - Optionally checks image size (KB) and dimensions (max width/height)
 
+With --enforce, oversized files (masters, thumbs/hero and their .webp siblings) are re-encoded
+in parallel before the checks run. A master is scaled down to fit --max-width/--max-height,
+then the highest JPEG/WebP quality (down to --min-quality) that fits --max-kb is found by binary
+search; if even that is too big, the image is downscaled further until it fits. Generated
+`<base>-<size>` variants are never resized (srcset lists them by size): they are re-rendered
+from their master at the highest quality that fits, and reported as failed if none does. Files
+are only replaced when the result is smaller (or a master broke the dimension limits), and a
+report of the bytes saved is written to --report.
+
 Exit codes:
 - 0: all checks passed (or only warnings if warn-only)
 - 1: validation / JSON parse error
 - 2: missing files or violations found (fatal unless --warn-only)
 
 Usage:
-  python tools/ci_validate.py [--json posts/blog-posts.json] [--max-kb 500] [--max-width 4000] [--max-height 4000] [--warn-only]
+  python tools/ci_validate.py [--json posts/blog-posts.json] [--max-kb 500] [--max-width 4000] [--max-height 4000] [--no-dimensions] [--warn-only]
+  python tools/ci_validate.py --enforce --max-kb 1024 [--min-quality 70] [--workers 4] [--report tools/size-report.json]
 
 Designed to run in CI (install Pillow before running if dimension checks are enabled).
 """
 import argparse
+import io
 import json
 import os
+import re
 import sys
 from pathlib import Path
 
-try:
-    from PIL import Image
-    PIL_AVAILABLE = True
-except Exception:
-    PIL_AVAILABLE = False
-
 ROOT = Path(__file__).resolve().parents[1]
 DEFAULT_JSON = ROOT / 'posts' / 'blog-posts.json'
+DEFAULT_REPORT = ROOT / 'tools' / 'size-report.json'
+
+# Formats --enforce can re-encode with a quality setting
+ENCODERS = {'.jpg': 'JPEG', '.jpeg': 'JPEG', '.webp': 'WEBP'}
+# Generated variants are blog-images/thumbs/<base>-<size>.jpg/.webp (tools/process_images.py)
+DERIVATIVE_RE = re.compile(r'^(?P<base>.+)-(?P<size>\d+)$')
+# Where the originals of derivatives are looked up, best first (as tools/regenerate_thumbs_all.py does)
+MASTER_DIRS = (ROOT / 'tools' / '_water_tmp', ROOT / 'raw-images', ROOT / 'blog-images')
 
 
 def load_json(path):
@@ -62,9 +76,21 @@ def resolve_path(ref: str) -> Path:
     return (ROOT / ref)
 
 
+def _load_pil_image():
+    # Pillow is only needed for dimension checks; importing it costs more than the rest of the
+    # validator, so defer it until the first image actually has to be opened.
+    try:
+        from PIL import Image
+        return Image
+    except Exception:
+        return None
+
+
 def check_posts(data, args):
     problems = []
     warnings = []
+    Image = None
+    pil_checked = False
 
     posts = data.get('posts')
     if posts is None:
@@ -102,7 +128,10 @@ def check_posts(data, args):
                             warnings.append(f"Post '{title}': file {fname} is {kb:.1f}KB > max_kb {args.max_kb}")
                     except Exception as e:
                         warnings.append(f"Could not determine size for {path}: {e}")
-                if (args.max_width or args.max_height) and PIL_AVAILABLE:
+                if (args.max_width or args.max_height) and not pil_checked:
+                    Image = _load_pil_image()
+                    pil_checked = True
+                if (args.max_width or args.max_height) and Image is not None:
                     try:
                         with Image.open(path) as im:
                             w, h = im.size
@@ -112,28 +141,257 @@ def check_posts(data, args):
                                 warnings.append(f"Post '{title}': image {fname} height {h}px > max_height {args.max_height}")
                     except Exception as e:
                         warnings.append(f"Could not open image {path} for dimension check: {e}")
-                elif (args.max_width or args.max_height) and not PIL_AVAILABLE:
+                elif args.max_width or args.max_height:
                     warnings.append("Pillow not installed — skipping image dimension checks (install pillow to enable)")
 
     return problems, warnings
 
 
+def referenced_files(data):
+    """Local files referenced by posts (image/thumb/hero), plus the .webp siblings of derivatives."""
+    files = set()
+    for p in data.get('posts') or []:
+        for key in ('image', 'thumb', 'hero'):
+            v = p.get(key)
+            if not v or not is_local(v):
+                continue
+            path = resolve_path(v)
+            if path.exists():
+                files.add(path)
+            webp = path.with_suffix('.webp')
+            if key != 'image' and webp.exists():
+                files.add(webp)
+    return sorted(files)
+
+
+def find_oversized(files, max_bytes, max_width, max_height, Image):
+    """Files over the byte budget or the dimension limits (dimensions are read from headers only)."""
+    out = []
+    for path in files:
+        if path.suffix.lower() not in ENCODERS:
+            continue
+        over = max_bytes is not None and path.stat().st_size > max_bytes
+        if not over and (max_width or max_height):
+            try:
+                with Image.open(path) as im:
+                    w, h = im.size
+                over = (max_width and w > max_width) or (max_height and h > max_height)
+            except Exception:
+                continue
+        if over:
+            out.append(path)
+    return out
+
+
+def _encode(im, fmt, quality):
+    buf = io.BytesIO()
+    if fmt == 'JPEG':
+        im.save(buf, format='JPEG', quality=quality, optimize=True, progressive=True)
+    else:
+        im.save(buf, format='WEBP', quality=quality, method=6)
+    return buf.getvalue()
+
+
+def _best_quality(im, fmt, max_bytes, min_q, max_q):
+    """Highest quality in [min_q, max_q] whose encoding fits max_bytes: (quality, data), or (None, smallest)."""
+    lo, hi = min_q, max_q
+    best = None
+    smallest = None
+    while lo <= hi:
+        q = (lo + hi) // 2
+        data = _encode(im, fmt, q)
+        if len(data) <= max_bytes:
+            best = (q, data)
+            lo = q + 1
+        else:
+            if q == min_q:
+                smallest = data
+            hi = q - 1
+    return best or (None, smallest if smallest is not None else _encode(im, fmt, min_q))
+
+
+def derivative_size(path: Path):
+    """Nominal size of a generated `<base>-<size>` variant in a thumbs/ directory, or None for a master."""
+    m = DERIVATIVE_RE.match(path.stem)
+    return int(m.group('size')) if m and path.parent.name == 'thumbs' else None
+
+
+def find_master(base):
+    for d in MASTER_DIRS:
+        for candidate in sorted(d.glob(f'{base}.*')):
+            if candidate.suffix.lower() in ('.jpg', '.jpeg', '.png', '.webp', '.tif', '.tiff'):
+                return candidate
+    return None
+
+
+def fit_derivative(path, size, max_bytes, min_quality=70, max_quality=92):
+    """Re-encode a `<base>-<size>` variant to fit max_bytes without changing its dimensions.
+
+    srcset advertises the variant as `<size>w` and its .jpg/.webp siblings must match, so only the
+    quality is searched. The variant is re-rendered from its master when one is found and yields
+    the same dimensions, so it is not encoded twice; otherwise its own pixels are used. A variant
+    that does not fit at `min_quality` is left alone and reported as failed.
+    """
+    from PIL import Image, ImageOps
+    from atomicio import atomic_write_bytes
+    from process_images import resize_variant
+
+    fmt = ENCODERS[path.suffix.lower()]
+    before = path.stat().st_size
+    with Image.open(path) as src:
+        current = src.size
+    entry = {'file': path.relative_to(ROOT).as_posix(), 'bytes_before': before, 'size_before': list(current)}
+    im = None
+    master = find_master(DERIVATIVE_RE.match(path.stem).group('base'))
+    if master is not None:
+        with Image.open(master) as src:
+            im = resize_variant(ImageOps.exif_transpose(src), size)
+        if im.size != current:
+            # A master smaller than the variant (or a different crop) would change its dimensions
+            im, master = None, None
+        else:
+            entry['master'] = master.relative_to(ROOT).as_posix()
+    if im is None:
+        with Image.open(path) as src:
+            im = src.convert('RGB')
+    budget = max_bytes if max_bytes is not None else before
+    quality, data = _best_quality(im, fmt, min(budget, before), min_quality, max_quality)
+    if quality is None and len(data) <= budget:
+        quality = min_quality
+    if quality is None:
+        entry.update(status=f'failed: over budget at q={min_quality} without going below {size}px',
+                     bytes_after=before, size_after=list(current), quality=None)
+    elif len(data) < before:
+        atomic_write_bytes(path, data)
+        entry.update(status='re-rendered' if master is not None else 're-encoded', bytes_after=len(data),
+                     size_after=list(im.size), quality=quality)
+    else:
+        entry.update(status='unchanged', bytes_after=before, size_after=list(current), quality=None)
+    return entry
+
+
+def fit_budget(path, max_bytes, max_width=None, max_height=None, min_quality=70, max_quality=92):
+    """Re-encode `path` in place to fit max_bytes and the dimension limits. Returns a report entry.
+
+    Only masters are downscaled; `<base>-<size>` variants keep their size (see fit_derivative).
+    """
+    from PIL import Image, ImageOps
+    from atomicio import atomic_write_bytes
+
+    path = Path(path)
+    size = derivative_size(path)
+    if size is not None:
+        return fit_derivative(path, size, max_bytes, min_quality, max_quality)
+    fmt = ENCODERS[path.suffix.lower()]
+    before = path.stat().st_size
+    with Image.open(path) as src:
+        im = ImageOps.exif_transpose(src).convert('RGB')
+    entry = {'file': path.relative_to(ROOT).as_posix(), 'bytes_before': before, 'size_before': list(im.size)}
+
+    bound = (max_width or im.width, max_height or im.height)
+    if im.width > bound[0] or im.height > bound[1]:
+        im = ImageOps.contain(im, bound, method=Image.LANCZOS)
+    budget = max_bytes if max_bytes is not None else before
+    # Aim for no more bytes than the original; settle for the quality floor if only that fits the budget
+    quality, data = _best_quality(im, fmt, min(budget, before), min_quality, max_quality)
+    if quality is None and len(data) <= budget:
+        quality = min_quality
+    # Still too big at the quality floor: shrink by the square root of the byte ratio and search again
+    while quality is None and min(im.size) > 64:
+        scale = max(0.5, min(0.95, (budget / len(data)) ** 0.5))
+        im = im.resize((max(1, round(im.width * scale)), max(1, round(im.height * scale))), Image.LANCZOS)
+        quality, data = _best_quality(im, fmt, budget, min_quality, max_quality)
+
+    # A file over the dimension limits is replaced even if the smaller encode is not smaller in bytes
+    if len(data) < before or list(im.size) != entry['size_before']:
+        atomic_write_bytes(path, data)
+        entry.update(status='re-encoded' if quality is not None else 'over budget', bytes_after=len(data),
+                     size_after=list(im.size), quality=quality or min_quality)
+    else:
+        entry.update(status='unchanged', bytes_after=before, size_after=entry['size_before'], quality=None)
+    return entry
+
+
+def _collect(files, futures):
+    """Wait for each file's fit_budget() future in order, printing a line per file."""
+    entries = []
+    for f, fut in zip(files, futures):
+        try:
+            entry = fut.result()
+        except Exception as e:
+            entry = {'file': f.relative_to(ROOT).as_posix(), 'status': f'failed: {e}'}
+        entries.append(entry)
+        if 'bytes_after' in entry:
+            print(f"  {entry['file']}: {entry['bytes_before'] / 1024:.1f}KB -> {entry['bytes_after'] / 1024:.1f}KB "
+                  f"({entry['status']}, {entry['size_after'][0]}x{entry['size_after'][1]}, q={entry['quality']})")
+        else:
+            print(f"  {entry['file']}: {entry['status']}")
+    return entries
+
+
+def enforce_budget(files, args):
+    """Re-encode `files` on a process pool and return the report."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    max_bytes = int(args.max_kb * 1024) if args.max_kb is not None else None
+    entries = []
+    # Variants are re-rendered from their masters, so they go first, before any master is downscaled
+    derivatives = [f for f in files if derivative_size(f) is not None]
+    masters = [f for f in files if derivative_size(f) is None]
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for batch in (derivatives, masters):
+            futures = [pool.submit(fit_budget, f, max_bytes, args.max_width, args.max_height, args.min_quality) for f in batch]
+            entries.extend(_collect(batch, futures))
+    before = sum(e.get('bytes_before', 0) for e in entries)
+    after = sum(e.get('bytes_after', e.get('bytes_before', 0)) for e in entries)
+    return {'max_kb': args.max_kb, 'max_width': args.max_width, 'max_height': args.max_height,
+            'files': entries, 'bytes_before': before, 'bytes_after': after, 'bytes_saved': before - after}
+
+
 def main(argv):
     parser = argparse.ArgumentParser()
     parser.add_argument('--json', default=str(DEFAULT_JSON), help='Path to posts/blog-posts.json')
     parser.add_argument('--max-kb', type=float, default=1024, help='Warn if image file size exceeds this KB value (default: 1024KB)')
     parser.add_argument('--max-width', type=int, default=4000, help='Warn if image width exceeds this (px)')
     parser.add_argument('--max-height', type=int, default=4000, help='Warn if image height exceeds this (px)')
+    parser.add_argument('--no-dimensions', action='store_true', help='Skip image dimension checks (Pillow is then never imported)')
     parser.add_argument('--warn-only', action='store_true', help='Do not exit non-zero on problems; only print')
     parser.add_argument('--fail-on-warn', action='store_true', help='Treat warnings as failures and exit non-zero')
+    parser.add_argument('--enforce', action='store_true', help='Re-encode oversized images in place to fit --max-kb/--max-width/--max-height')
+    parser.add_argument('--min-quality', type=int, default=70, help='With --enforce: lowest quality to try before downscaling')
+    parser.add_argument('--workers', type=int, default=None, help='With --enforce: worker processes (default: CPU count)')
+    parser.add_argument('--report', default=str(DEFAULT_REPORT), help='With --enforce: where to write the bytes-saved report')
 
     args = parser.parse_args(argv)
+    if args.no_dimensions:
+        args.max_width = args.max_height = None
 
     data = load_json(args.json)
     if data is None:
         return 1
 
+    enforce_failures = []
+    if args.enforce:
+        # Only --enforce writes files; the plain check stays free of atomicio's tempfile import
+        from atomicio import atomic_write_json
+        Image = _load_pil_image()
+        if Image is None:
+            print('ERROR: --enforce needs Pillow (pip install pillow)')
+            return 1
+        max_bytes = int(args.max_kb * 1024) if args.max_kb is not None else None
+        oversized = find_oversized(referenced_files(data), max_bytes, args.max_width, args.max_height, Image)
+        print(f'Enforcing image budget: {len(oversized)} oversized file(s)')
+        if oversized:
+            report = enforce_budget(oversized, args)
+            atomic_write_json(Path(args.report), report)
+            print(f"Saved {report['bytes_saved'] / 1024:.1f}KB "
+                  f"({report['bytes_before'] / 1024:.1f}KB -> {report['bytes_after'] / 1024:.1f}KB); report written to {args.report}")
+            enforce_failures = [e for e in report['files'] if e['status'].startswith('failed')]
+        print()
+
     problems, warnings = check_posts(data, args)
+    for e in enforce_failures:
+        problems.append(f"--enforce could not fit {e['file']}: {e['status'][len('failed: '):]}")
 
     if warnings:
         print("Warnings:")
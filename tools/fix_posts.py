@@ -4,58 +4,197 @@ Scan and repair post HTML files in `posts/`:
 - Ensure a single closing </body></html> at the end
 - Ensure `/scripts/post-meta.js` and `/scripts/highlight-footer.js` are included once before </body>
 - Remove stray text after closing html
+- Remove stray `.catch(...)` fragments left in page text (never inside <script>/<style>)
+
+Each file is tokenized once and repaired in a single pass over the tokens. Files are
+processed on a worker pool, written only when the repaired text really differs (via
+temp-file + rename), and files whose content hash is recorded as clean in
+tools/fix-posts-cache.json are skipped without being parsed again.
+
+Usage:
+  python tools/fix_posts.py [--dry-run] [--workers 4] [--no-cache]
+
+--dry-run prints a unified diff per file instead of writing anything.
 """
-from pathlib import Path
+import argparse
+import difflib
+import hashlib
+import json
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from atomicio import atomic_write_bytes, atomic_write_text
 
 ROOT = Path(__file__).resolve().parents[1]
 POSTS = ROOT / 'posts'
+CACHE_FILE = ROOT / 'tools' / 'fix-posts-cache.json'
+
+# Bump when the repair rules change so cached "clean" hashes are re-checked
+ENGINE_VERSION = 3
+
+MANAGED_SCRIPTS = ('/scripts/post-meta.js', '/scripts/highlight-footer.js')
+SCRIPTS_BLOCK = ''.join(f'\n    <script src="{src}"></script>' for src in MANAGED_SCRIPTS) + '\n'
+
+# Comments, whole <script>/<style> elements, any other tag, runs of text, or a lone '<'
+TOKEN_RE = re.compile(
+    r'<!--.*?-->'
+    r'|<(script|style)\b[^>]*>.*?</\1\s*>'
+    r'|</?[a-zA-Z!][^>]*>'
+    r'|[^<]+'
+    r'|<',
+    re.S | re.I,
+)
+MANAGED_SCRIPT_RE = re.compile(r'<script\s+src="(%s)"\s*>\s*</script\s*>$' % '|'.join(map(re.escape, MANAGED_SCRIPTS)), re.I)
+CLOSE_BODY_RE = re.compile(r'</body\s*>$', re.I)
+CLOSE_HTML_RE = re.compile(r'</html\s*>$', re.I)
+STRAY_CATCH_RE = re.compile(r"\.catch\([^\)]*\);?\s*")
+
+
+def _is_text(tok):
+    return tok == '<' or not tok.startswith('<')
+
+
+def _trim_trailing_ws(out):
+    while out and _is_text(out[-1]) and not out[-1].strip():
+        out.pop()
+    if out and _is_text(out[-1]):
+        out[-1] = out[-1].rstrip()
+
 
 def repair_text(text):
-    orig = text
-    # Remove any accidental text after closing </html>
-    if '</html>' in text:
-        parts = text.split('</html>')
-        text = '</html>'.join(parts[:1]) + '</html>'
-
-    # Normalize closing tags: ensure single </body></html>
-    # Remove duplicated closing tags
-    text = re.sub(r'(</body>\s*){2,}', '</body>\n', text, flags=re.I)
-    text = re.sub(r'(</html>\s*){2,}', '</html>\n', text, flags=re.I)
-
-    # Ensure scripts are inside body: remove any scripts after </html> already handled
-
-    # Ensure post-meta.js and highlight-footer.js appear once before </body>
-    # Remove any existing occurrences
-    text = re.sub(r"<script\s+src=\"/scripts/post-meta.js\"></script>\s*", '', text)
-    text = re.sub(r"<script\s+src=\"/scripts/highlight-footer.js\"></script>\s*", '', text)
-
-    # Insert both scripts before closing </body>
-    if '</body>' in text:
-        text = text.replace('</body>', '    <script src="/scripts/post-meta.js"></script>\n    <script src="/scripts/highlight-footer.js"></script>\n</body>')
+    out = []
+    body_idx = None
+    html_idx = None
+    for m in TOKEN_RE.finditer(text):
+        tok = m.group(0)
+        if _is_text(tok):
+            if '.catch(' in tok:
+                tok = STRAY_CATCH_RE.sub('', tok)
+            out.append(tok)
+        elif MANAGED_SCRIPT_RE.match(tok):
+            # Dropped here and re-inserted once before </body>, together with its indentation
+            _trim_trailing_ws(out)
+        elif CLOSE_BODY_RE.match(tok):
+            # Keep only the last </body>; earlier (duplicated) ones are blanked out
+            if body_idx is not None:
+                out[body_idx] = ''
+            _trim_trailing_ws(out)
+            out.append('</body>')
+            body_idx = len(out) - 1
+        elif CLOSE_HTML_RE.match(tok):
+            # Everything after the first </html> is stray
+            out.append('</html>')
+            html_idx = len(out) - 1
+            break
+        else:
+            out.append(tok)
+
+    if body_idx is not None:
+        out.insert(body_idx, SCRIPTS_BLOCK)
+    elif html_idx is not None:
+        out.insert(html_idx, SCRIPTS_BLOCK.lstrip('\n'))
     else:
-        # If no body tag, append scripts at end
-        text = text + '\n    <script src="/scripts/post-meta.js"></script>\n    <script src="/scripts/highlight-footer.js"></script>\n'
+        # If no body tag, append scripts at end (after trimming, so a second run sees the same layout)
+        _trim_trailing_ws(out)
+        out.append(SCRIPTS_BLOCK)
+
+    new_text = ''.join(out)
+    return new_text, new_text != text
 
-    # Clean up common broken fragments like stray ".catch(..." that may have been injected
-    text = re.sub(r"\.catch\([^\)]*\);?\s*", '', text)
 
-    changed = (text != orig)
-    return text, changed
+def _sha256(data: bytes):
+    return hashlib.sha256(data).hexdigest()
+
+
+def repair_file(path, dry_run=False):
+    """Repair one post. Returns (name, changed, digest_of_clean_content, diff_or_None)."""
+    path = Path(path)
+    text = path.read_text(encoding='utf-8')
+    new_text, changed = repair_text(text)
+    diff = None
+    if changed:
+        if dry_run:
+            diff = ''.join(difflib.unified_diff(
+                text.splitlines(keepends=True), new_text.splitlines(keepends=True),
+                fromfile=f'a/posts/{path.name}', tofile=f'b/posts/{path.name}'))
+            if not diff.endswith('\n'):
+                diff += '\n\\ No newline at end of file\n'
+        else:
+            atomic_write_text(path, new_text)
+    return path.name, changed, _sha256(new_text.encode('utf-8')), diff
+
+
+def load_cache():
+    try:
+        data = json.loads(CACHE_FILE.read_text(encoding='utf-8'))
+    except Exception:
+        return {}
+    if data.get('version') != ENGINE_VERSION:
+        return {}
+    return data.get('files', {})
+
+
+def save_cache(files):
+    atomic_write_bytes(CACHE_FILE, json.dumps({'version': ENGINE_VERSION, 'files': files}, indent=2, sort_keys=True).encode('utf-8'))
+
+
+def is_known_clean(path: Path, entry):
+    """True if `path` still has the content recorded as clean in the cache."""
+    if not entry:
+        return False
+    st = path.stat()
+    if st.st_size == entry.get('size') and st.st_mtime_ns == entry.get('mtime_ns'):
+        return True
+    # Touched but maybe not modified: fall back to the content hash
+    return st.st_size == entry.get('size') and _sha256(path.read_bytes()) == entry.get('sha256')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Repair post HTML files in posts/')
+    parser.add_argument('--dry-run', action='store_true', help='Print per-file diffs instead of writing')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count, 1 = no pool)')
+    parser.add_argument('--no-cache', dest='use_cache', action='store_false', help='Re-scan every post, ignoring the clean-hash cache')
+    args = parser.parse_args(argv)
+
+    cache = load_cache() if args.use_cache else {}
+    files = sorted(POSTS.glob('*.html'))
+    todo = [p for p in files if not is_known_clean(p, cache.get(p.name))]
+    skipped = len(files) - len(todo)
+
+    workers = args.workers or os.cpu_count() or 1
+    if workers > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+            results = list(pool.map(repair_file, todo, [args.dry_run] * len(todo)))
+    else:
+        results = [repair_file(p, args.dry_run) for p in todo]
 
-def main():
     changed_files = []
-    for p in sorted(POSTS.glob('*.html')):
-        text = p.read_text(encoding='utf-8')
-        new_text, changed = repair_text(text)
+    for name, changed, digest, diff in results:
         if changed:
-            p.write_text(new_text, encoding='utf-8')
-            changed_files.append(p.name)
-            print('Repaired', p.name)
+            changed_files.append(name)
+            if args.dry_run:
+                print(diff, end='')
+            else:
+                print('Repaired', name)
+        if not args.dry_run or not changed:
+            st = (POSTS / name).stat()
+            cache[name] = {'sha256': digest, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+    # Forget posts that no longer exist
+    names = {p.name for p in files}
+    cache = {k: v for k, v in cache.items() if k in names}
+    if args.use_cache:
+        save_cache(cache)
+
+    print(f'\nScanned {len(todo)} file(s), skipped {skipped} known-clean file(s).')
     if changed_files:
-        print('\nFiles repaired:', len(changed_files))
+        verb = 'needing repair' if args.dry_run else 'repaired'
+        print(f'Files {verb}:', len(changed_files))
     else:
         print('No repairs needed')
 
+
 if __name__ == '__main__':
     main()
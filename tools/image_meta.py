@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Extract capture metadata (EXIF, with XMP as a fallback) from source images and feed it into
+posts/blog-posts.json.
+
+Fields extracted: capture date, GPS position, camera, lens and EXIF orientation. Results are
+cached in tools/image-meta-cache.json keyed by the sha256 of the source file, so each original
+is only parsed once.
+
+Watermarked masters in blog-images/ are re-encoded without EXIF, so metadata has to come from
+the originals: `raw-images/<name>` is preferred, then `tools/_water_tmp/<name>`, then
+`blog-images/<name>`.
+
+When a post's source has GPS data, the post gets `hasMap: true` and `mapCoordinates`
+({"lat", "lon"}), which is what scripts/post-meta.js passes to initMap(). `captured`,
+`camera` and `lens` are filled in when present.
+
+Usage:
+  python tools/image_meta.py raw-images/IMG_1234.JPG        # print metadata
+  python tools/image_meta.py --update-json [--dry-run]     # fill blog-posts.json for all posts
+"""
+import argparse
+import hashlib
+import io
+import json
+import math
+import os
+import re
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from atomicio import atomic_write_json
+from post_index import save_posts
+
+ROOT = Path(__file__).resolve().parents[1]
+POSTS_JSON = ROOT / 'posts' / 'blog-posts.json'
+CACHE_FILE = ROOT / 'tools' / 'image-meta-cache.json'
+SOURCE_DIRS = (ROOT / 'raw-images', ROOT / 'tools' / '_water_tmp', ROOT / 'blog-images')
+
+# Bump when the extracted fields change so cached entries are re-read
+META_VERSION = 2
+
+# EXIF tag ids
+EXIF_IFD, GPS_IFD = 0x8769, 0x8825
+MAKE, MODEL, ORIENTATION, DATETIME = 271, 272, 274, 306
+DATETIME_ORIGINAL, LENS_MODEL = 36867, 42036
+GPS_LAT_REF, GPS_LAT, GPS_LON_REF, GPS_LON = 1, 2, 3, 4
+
+XMP_DATE_RE = re.compile(r'(?:exif:DateTimeOriginal|xmp:CreateDate|photoshop:DateCreated)\s*=\s*"([^"]+)"|<(?:exif:DateTimeOriginal|xmp:CreateDate)>([^<]+)<')
+XMP_GPS_RE = re.compile(r'exif:GPS(Latitude|Longitude)\s*=\s*"([^"]+)"|<exif:GPS(Latitude|Longitude)>([^<]+)<')
+XMP_LENS_RE = re.compile(r'(?:aux:Lens|exifEX:LensModel)\s*=\s*"([^"]+)"|<(?:aux:Lens|exifEX:LensModel)>([^<]+)<')
+
+
+def sha256_bytes(data: bytes):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _dms_to_degrees(dms, ref):
+    try:
+        deg = float(dms[0]) + float(dms[1]) / 60 + float(dms[2]) / 3600
+    except (TypeError, ValueError, IndexError, ZeroDivisionError):
+        return None
+    if isinstance(ref, bytes):
+        ref = ref.decode('ascii', 'ignore')
+    return round(-deg if str(ref).strip().upper() in ('S', 'W') else deg, 6)
+
+
+def _gps(lat, lon):
+    # Cameras without a fix write 0/0 rationals (NaN) or a 0,0 position; neither is a real place
+    if lat is None or lon is None or not (math.isfinite(lat) and math.isfinite(lon)):
+        return None
+    if (lat, lon) == (0, 0) or abs(lat) > 90 or abs(lon) > 180:
+        return None
+    return {'lat': lat, 'lon': lon}
+
+
+def _xmp_coordinate(value):
+    # XMP stores GPS as "DDD,MM.mmmmR" or "DDD,MM,SSR"
+    m = re.match(r'\s*(\d+),(\d+(?:\.\d+)?)(?:,(\d+(?:\.\d+)?))?([NSEW])\s*$', value)
+    if not m:
+        return None
+    return _dms_to_degrees((m.group(1), m.group(2), m.group(3) or 0), m.group(4))
+
+
+def _exif_date(value):
+    if not value:
+        return None
+    value = str(value).strip().replace('\x00', '')
+    for fmt in ('%Y:%m:%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value[:19], fmt).isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def _clean(value):
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', 'ignore')
+    value = str(value).replace('\x00', '').strip()
+    return value or None
+
+
+def extract_metadata(im):
+    """Read capture metadata from an opened PIL image (headers only; pixels are not decoded)."""
+    meta = {'captured': None, 'gps': None, 'camera': None, 'lens': None, 'orientation': 1}
+    exif = im.getexif()
+    if exif:
+        sub = exif.get_ifd(EXIF_IFD)
+        meta['captured'] = _exif_date(sub.get(DATETIME_ORIGINAL) or exif.get(DATETIME))
+        make, model = _clean(exif.get(MAKE)), _clean(exif.get(MODEL))
+        if model and make and not model.lower().startswith(make.lower()):
+            model = f'{make} {model}'
+        meta['camera'] = model or make
+        meta['lens'] = _clean(sub.get(LENS_MODEL))
+        meta['orientation'] = int(exif.get(ORIENTATION) or 1)
+        gps = exif.get_ifd(GPS_IFD)
+        if gps.get(GPS_LAT) and gps.get(GPS_LON):
+            lat = _dms_to_degrees(gps[GPS_LAT], gps.get(GPS_LAT_REF, 'N'))
+            lon = _dms_to_degrees(gps[GPS_LON], gps.get(GPS_LON_REF, 'E'))
+            meta['gps'] = _gps(lat, lon)
+
+    xmp = im.info.get('xmp') or im.info.get('XML:com.adobe.xmp')
+    if xmp:
+        if isinstance(xmp, bytes):
+            xmp = xmp.decode('utf-8', 'ignore')
+        if not meta['captured']:
+            m = XMP_DATE_RE.search(xmp)
+            if m:
+                meta['captured'] = _exif_date(m.group(1) or m.group(2))
+        if not meta['lens']:
+            m = XMP_LENS_RE.search(xmp)
+            if m:
+                meta['lens'] = _clean(m.group(1) or m.group(2))
+        if not meta['gps']:
+            coords = {}
+            for m in XMP_GPS_RE.finditer(xmp):
+                axis = (m.group(1) or m.group(3)).lower()
+                coords[axis] = _xmp_coordinate(m.group(2) or m.group(4))
+            meta['gps'] = _gps(coords.get('latitude'), coords.get('longitude'))
+    return meta
+
+
+class MetaCache:
+    """sha256 -> metadata, persisted as JSON. Entries written under another `version` are dropped."""
+
+    def __init__(self, path: Path = CACHE_FILE, version=META_VERSION):
+        self.path = path
+        self.version = version
+        self.dirty = False
+        try:
+            data = json.loads(path.read_text(encoding='utf-8'))
+            self.entries = data.get('entries', {}) if data.get('version') == version else {}
+        except Exception:
+            self.entries = {}
+
+    def get(self, digest):
+        return self.entries.get(digest)
+
+    def put(self, digest, meta):
+        if self.entries.get(digest) != meta:
+            self.entries[digest] = meta
+            self.dirty = True
+
+    def save(self):
+        if self.dirty:
+            atomic_write_json(self.path, {'version': self.version, 'entries': self.entries})
+            self.dirty = False
+
+
+def read_source(path: Path, cache: MetaCache = None):
+    """Read a source file once. Returns (raw bytes, sha256, metadata).
+
+    Metadata comes from the cache when the content hash is known; otherwise only the image
+    headers are parsed. Callers can decode `raw` themselves (see tools/pipeline.py), so the
+    file is never read or decoded twice.
+    """
+    from PIL import Image
+
+    raw = Path(path).read_bytes()
+    digest = sha256_bytes(raw)
+    meta = cache.get(digest) if cache is not None else None
+    if meta is None:
+        with Image.open(io.BytesIO(raw)) as im:
+            meta = cached_metadata(im, digest, cache)
+    return raw, digest, meta
+
+
+def cached_metadata(im, digest, cache: MetaCache = None):
+    """Metadata for an image that is already open, from the cache when `digest` is known."""
+    meta = cache.get(digest) if cache is not None else None
+    if meta is None:
+        meta = extract_metadata(im)
+        if cache is not None:
+            cache.put(digest, meta)
+    return meta
+
+
+def apply_to_post(post, meta):
+    """Fill post fields from metadata. Returns True if the post changed."""
+    before = dict(post)
+    if meta.get('gps'):
+        post['hasMap'] = True
+        post['mapCoordinates'] = {'lat': meta['gps']['lat'], 'lon': meta['gps']['lon']}
+    for key in ('captured', 'camera', 'lens'):
+        if meta.get(key):
+            post[key] = meta[key]
+    return post != before
+
+
+def find_source(fname):
+    for d in SOURCE_DIRS:
+        candidate = d / fname
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Extract EXIF/XMP metadata and fill posts/blog-posts.json')
+    parser.add_argument('files', nargs='*', help='Image files to print metadata for')
+    parser.add_argument('--update-json', action='store_true', help='Fill hasMap/mapCoordinates/captured/camera/lens for every post')
+    parser.add_argument('--dry-run', action='store_true', help='With --update-json, report changes without writing')
+    args = parser.parse_args(argv)
+
+    cache = MetaCache()
+    for f in args.files:
+        _, digest, meta = read_source(ROOT / f, cache)
+        print(f, json.dumps(meta, indent=2))
+
+    if args.update_json:
+        data = json.loads(POSTS_JSON.read_text(encoding='utf-8'))
+        changed = 0
+        for post in data.get('posts', []):
+            img = post.get('image')
+            src = find_source(os.path.basename(img)) if img else None
+            if src is None:
+                continue
+            try:
+                _, _, meta = read_source(src, cache)
+            except Exception as e:
+                print(f'Could not read metadata from {src}: {e}')
+                continue
+            if apply_to_post(post, meta):
+                changed += 1
+                print(f"Updated {post.get('title')}: {json.dumps(meta)}")
+        if changed and not args.dry_run:
+            save_posts(data, path=POSTS_JSON)
+            print('Updated', POSTS_JSON)
+        elif not changed:
+            print('No posts updated')
+
+    cache.save()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
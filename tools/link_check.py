@@ -45,7 +45,7 @@ def normalize_link(link, html_file_dir):
     return os.path.normpath(os.path.join(html_file_dir, link))
 
 
-def main():
+def main(argv=None):
     html_files = []
     for dirpath, dirnames, filenames in os.walk(ROOT):
         # skip .git and .venv
@@ -56,6 +56,9 @@ def main():
         # skip backups folder (local site backups)
         if 'backups' in dirpath.split(os.sep):
             continue
+        # skip build output (tools/build_site.py)
+        if 'dist' in dirpath.split(os.sep):
+            continue
         for f in filenames:
             if f.lower().endswith('.html'):
                 html_files.append(os.path.join(dirpath, f))
@@ -9,6 +9,10 @@ Usage:
 Without --apply it will run in dry-run mode and print planned changes.
 
 It writes tools/rename-map.json with mapping of old -> new.
+
+The renames, the JSON/reference updates and the rename map are committed as one transaction
+(tools/atomicio.py): an interrupted run never leaves renamed images with stale references, and
+a commit cut off midway is finished the next time the script runs.
 """
 import os
 import re
@@ -16,10 +20,14 @@ import json
 import argparse
 from pathlib import Path
 
+from atomicio import Transaction
+from post_index import save_posts
+
 ROOT = Path(__file__).resolve().parents[1]
 BLOG_IMAGES = ROOT / 'blog-images'
 POSTS_JSON = ROOT / 'posts' / 'blog-posts.json'
 RENAME_MAP = ROOT / 'tools' / 'rename-map.json'
+JOURNAL = ROOT / 'tools' / 'normalize-journal.json'
 
 
 def slugify(name: str) -> str:
@@ -48,11 +56,14 @@ def find_all_files(root: Path):
             yield p
 
 
-def main(dry_run=True):
+def normalize(dry_run=True):
     if not BLOG_IMAGES.exists():
         print('No blog-images directory found at', BLOG_IMAGES)
         return
 
+    # Opening the transaction finishes any commit a previous run was interrupted in
+    txn = Transaction(JOURNAL)
+
     # Build rename map
     rename_map = {}
     conflicts = {}
@@ -63,8 +74,9 @@ def main(dry_run=True):
                 # Resolve collisions
                 candidate = new_name
                 i = 1
-                while (BLOG_IMAGES / candidate).exists() and (BLOG_IMAGES / candidate).name != p.name:
-                    # If the candidate exists and it's not the same file
+                while ((BLOG_IMAGES / candidate).exists() and (BLOG_IMAGES / candidate).name != p.name) \
+                        or candidate in rename_map.values():
+                    # If the candidate exists and it's not the same file, or another rename already claims it
                     candidate_base = candidate.rsplit('.', 1)[0]
                     ext = candidate.rsplit('.', 1)[1]
                     candidate = f"{candidate_base}-{i}.{ext}"
@@ -83,17 +95,20 @@ def main(dry_run=True):
         print('\nDry run mode, no files changed. Run with --apply to perform the renames.')
         return
 
-    # Apply renames in filesystem
+    with txn:
+        apply_renames(txn, rename_map)
+
+
+def apply_renames(txn: Transaction, rename_map):
+    # Stage renames; they only happen when the transaction commits
     applied_map = {}
     for old, new in rename_map.items():
-        src = BLOG_IMAGES / old
-        dst = BLOG_IMAGES / new
-        try:
-            src.rename(dst)
-            applied_map[old] = new
-            print(f"Renamed: {old} -> {new}")
-        except Exception as e:
-            print(f"Failed to rename {old} -> {new}: {e}")
+        txn.rename(BLOG_IMAGES / old, BLOG_IMAGES / new)
+        applied_map[old] = new
+        print(f"Renaming: {old} -> {new}")
+
+    # New contents of every file that needs updating, staged together at the end
+    updates = {}
 
     # Update posts/blog-posts.json
     if POSTS_JSON.exists():
@@ -110,7 +125,7 @@ def main(dry_run=True):
                         changed = True
                         print(f"Updated JSON image reference: {fname} -> {newfname}")
             if changed:
-                POSTS_JSON.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding='utf-8')
+                updates[POSTS_JSON] = json.dumps(data, indent=2, ensure_ascii=False)
                 print('Updated', POSTS_JSON)
         except Exception as e:
             print('Failed to update', POSTS_JSON, e)
@@ -121,26 +136,39 @@ def main(dry_run=True):
     for f in all_files:
         # Only text files
         try:
-            text = f.read_text(encoding='utf-8')
+            original = f.read_text(encoding='utf-8')
         except Exception:
             continue
+        text = updates.get(f, original)
         updated = text
         for old, new in applied_map.items():
             if old in updated:
                 updated = updated.replace(old, new)
         if updated != text:
-            f.write_text(updated, encoding='utf-8')
             refs_changed += 1
             print(f'Updated references in {f.relative_to(ROOT)}')
+        if updated != original:
+            updates[f] = updated
+
+    # blog-posts.json goes through save_posts, which also rebuilds the archive shards from it
+    posts_text = updates.pop(POSTS_JSON, None)
+    for f, text in updates.items():
+        txn.write_text(f, text)
+    if posts_text is not None:
+        save_posts(json.loads(posts_text), txn, POSTS_JSON)
 
     # Write rename map
-    RENAME_MAP.write_text(json.dumps(applied_map, indent=2), encoding='utf-8')
+    txn.write_text(RENAME_MAP, json.dumps(applied_map, indent=2))
     print('\nDone. Files renamed:', len(applied_map), 'files. Files updated:', refs_changed)
     print('Rename mapping written to', RENAME_MAP)
 
 
-if __name__ == '__main__':
+def main(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument('--apply', action='store_true', help='Perform the renames (otherwise dry-run)')
-    args = parser.parse_args()
-    main(dry_run=not args.apply)
+    args = parser.parse_args(argv)
+    normalize(dry_run=not args.apply)
+
+
+if __name__ == '__main__':
+    main()
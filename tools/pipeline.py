@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+In-memory watermark -> resize -> encode pipeline.
+
+The standalone tools communicate through disk: `watermark.py` writes a JPEG that
+`process_images.py` then reopens and decodes again. This module chains the same
+stages on decoded `Image` objects instead:
+
+ 1. read the source once: EXIF/XMP metadata is extracted from the same buffer (cached by
+    content hash, tools/image_meta.py), the pixels are decoded once, EXIF orientation is applied
+    in memory and the watermark is drawn (tools/watermark.py)
+ 2. write the watermarked master to `blog-images/` (temp-file + rename)
+ 3. hand the decoded pixels to a worker pool through `multiprocessing.shared_memory`
+    (only a small descriptor is pickled, never the pixel data). The master is shared as
+    4-byte RGBX, a layout Pillow can wrap in place, so workers read the shared block directly
+    instead of copying it
+ 4. each worker resizes/encodes the variants straight from the shared buffer
+    (tools/process_images.py; only the small resized outputs are converted back to RGB) and
+    writes them via temp-file + rename
+
+Only the final outputs touch the disk.
+
+Usage:
+  python tools/pipeline.py raw-images/IMG_1234.JPG raw-images/IMG_1235.JPG --watermark-text monoismore.com
+  python tools/pipeline.py raw-images/*.jpg --no-watermark --workers 4
+"""
+import argparse
+import io
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+from atomicio import atomic_save_image
+from image_meta import cached_metadata, sha256_bytes
+from process_images import compute_placeholder, render_variants, update_posts_json
+from watermark import apply_watermark, load_font
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+# Modes Image.frombuffer maps without copying; anything else (e.g. 3-byte RGB) gets a private copy
+SHARED_MODES = ('RGBX', 'RGBA', 'L')
+
+
+def share_image(im):
+    """Copy an image's pixels into a new shared-memory block.
+
+    RGB images are packed as RGBX so `attach_image` can map them in place. Returns
+    (shm, descriptor). The descriptor is a small tuple that can be sent to another
+    process; the caller owns `shm` and must close/unlink it once every consumer is done.
+    """
+    mode = 'RGBX' if im.mode == 'RGB' else im.mode
+    if mode not in SHARED_MODES:
+        im, mode = im.convert('RGBX'), 'RGBX'
+    raw = im.tobytes('raw', mode)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, len(raw)))
+    shm.buf[:len(raw)] = raw
+    return shm, (shm.name, mode, im.size)
+
+
+def attach_image(descriptor):
+    """Map a shared-memory descriptor back to an Image without copying the pixels.
+
+    Returns (shm, image); release the image before calling `shm.close()`.
+    """
+    name, mode, size = descriptor
+    shm = shared_memory.SharedMemory(name=name)
+    im = Image.frombuffer(mode, size, shm.buf, 'raw', mode, 0, 1)
+    return shm, im
+
+
+def _render_shared(descriptor, base, dest_dir, sizes, make_webp, quality_map):
+    shm, im = attach_image(descriptor)
+    try:
+        return render_variants(im, base, Path(dest_dir), sizes=sizes, make_webp=make_webp, quality_map=quality_map)
+    finally:
+        # The image maps shm.buf in place; drop it before closing the mapping
+        del im
+        try:
+            shm.close()
+        except BufferError:
+            # A propagating exception's traceback still references the image; the mapping
+            # is released with it, and closing here would hide the original error
+            pass
+
+
+def prepare_master(src: Path, font=None, watermark_text=None, meta_cache=None, placeholder_cache=None):
+    """Read and decode `src` once; return (RGB master, metadata, placeholder or None).
+
+    EXIF/XMP metadata is taken from the same buffer (or the cache, by content hash) and the
+    EXIF orientation is applied to the decoded pixels, so the master is upright even though
+    the saved JPEG carries no EXIF. With `placeholder_cache` the LQIP/colour/size fields
+    (tools/process_images.py) come from the cache or the upright pixels, keyed by the same hash.
+    The master is watermarked if a font/text is given.
+    """
+    raw = Path(src).read_bytes()
+    digest = sha256_bytes(raw)
+    with Image.open(io.BytesIO(raw)) as im:
+        meta = cached_metadata(im, digest, meta_cache)
+        im = ImageOps.exif_transpose(im)
+        placeholder = None
+        if placeholder_cache is not None:
+            placeholder = placeholder_cache.get(digest)
+            if placeholder is None:
+                placeholder = compute_placeholder(im)
+                placeholder_cache.put(digest, placeholder)
+        if font is not None and watermark_text:
+            return apply_watermark(im, watermark_text, font), meta, placeholder
+        return im.convert('RGB'), meta, placeholder
+
+
+def run_pipeline(sources, master_dir: Path, thumbs_dir: Path, watermark_text=None, font=None,
+                 sizes=(1600, 800, 400), make_webp=True, quality_map=92, workers=None, names=None,
+                 meta_cache=None, meta_out=None, placeholder_cache=None, placeholder_out=None):
+    """Run the full pipeline over `sources` and return the process_images-style mapping.
+
+    `names` optionally maps each source Path to the output filename (defaults to the source name
+    with a .jpg extension). At most `workers * 2` decoded images are held in memory at a time.
+    If `meta_out` is a dict it receives each output name's source metadata (tools/image_meta.py),
+    and, with a `placeholder_cache` (process_images.load_placeholder_cache()), `placeholder_out`
+    its placeholder fields computed from the decoded source.
+    """
+    workers = workers or os.cpu_count() or 1
+    names = names or {}
+    mapping = {}
+    pending = {}
+
+    def collect(done):
+        for fut in done:
+            out_name, shm = pending.pop(fut)
+            try:
+                mapping[out_name] = fut.result()
+            except Exception as e:
+                print(f"Failed to render variants for {out_name}: {e}")
+                mapping[out_name] = {}
+            finally:
+                shm.close()
+                shm.unlink()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for src in sources:
+            src = Path(src)
+            out_name = names.get(src) or f"{src.stem}.jpg"
+            try:
+                master, meta, placeholder = prepare_master(src, font=font, watermark_text=watermark_text,
+                                                           meta_cache=meta_cache, placeholder_cache=placeholder_cache)
+                if meta_out is not None:
+                    meta_out[out_name] = meta
+                if placeholder_out is not None:
+                    placeholder_out[out_name] = placeholder
+                atomic_save_image(master, master_dir / out_name, format='JPEG')
+                print('Wrote master', master_dir / out_name)
+                shm, desc = share_image(master)
+            except Exception as e:
+                print(f"Failed to prepare {src}: {e}")
+                continue
+            del master
+            fut = pool.submit(_render_shared, desc, Path(out_name).stem, str(thumbs_dir), tuple(sizes), make_webp, quality_map)
+            pending[fut] = (out_name, shm)
+            if len(pending) >= workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        collect(list(pending))
+    return mapping
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Watermark, resize and encode images in one pass without intermediate files')
+    parser.add_argument('sources', nargs='+', help='Source image paths (relative to repo root or absolute)')
+    parser.add_argument('--master-dir', default='blog-images', help='Where watermarked masters are written')
+    parser.add_argument('--dest', default='blog-images/thumbs', help='Destination directory for thumbs')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1600, 800, 400], help='Sizes (px) to generate')
+    parser.add_argument('--no-webp', dest='webp', action='store_false', help='Do not create webp variants')
+    parser.add_argument('--quality', type=int, default=92, help='JPEG quality for outputs')
+    parser.add_argument('--watermark-text', default='monoismore.com', help='Watermark text to apply')
+    parser.add_argument('--watermark-size', type=int, default=32, help='Watermark font size')
+    parser.add_argument('--font', default=None, help='Path to TTF font to use')
+    parser.add_argument('--no-watermark', dest='watermark', action='store_false', help='Skip the watermark stage')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes for resize/encode (default: CPU count)')
+    parser.add_argument('--update-json', action='store_true', help='Update thumb/hero in posts/blog-posts.json')
+    args = parser.parse_args(argv)
+
+    sources = []
+    for s in args.sources:
+        p = (ROOT / s).resolve()
+        if not p.exists():
+            print('Source image not found:', p)
+            return 1
+        sources.append(p)
+
+    font = load_font(args.font, args.watermark_size) if args.watermark else None
+    mapping = run_pipeline(sources, ROOT / args.master_dir, ROOT / args.dest,
+                           watermark_text=args.watermark_text if args.watermark else None, font=font,
+                           sizes=args.sizes, make_webp=args.webp, quality_map=args.quality, workers=args.workers)
+    print(f'Processed {len(mapping)} image(s)')
+    if args.update_json:
+        update_posts_json(mapping, args.sizes)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Date index over posts/blog-posts.json.
+
+`published` is stored as a `DD-MM-YYYY` string. This module parses it once into a date and
+keeps the posts ordered newest first (ties keep their existing order, so the most recently
+added post of a day stays on top). Lookups by date range, year or month are binary searches
+over the sorted dates.
+
+It also writes per-year archive shards, so an archive page only downloads the year it shows:
+  posts/archive/index.json   [{"year": 2025, "count": 16, "url": "posts/archive/2025.json"}, ...]
+  posts/archive/<year>.json  {"year": 2025, "posts": [...newest first, with "date": "YYYY-MM-DD"]}
+Shards whose content did not change are not rewritten. The shards copy every post field, so
+every tool that rewrites blog-posts.json goes through `save_posts`, which refreshes them too.
+
+Usage:
+  python tools/post_index.py --year 2025
+  python tools/post_index.py --month 2024-10
+  python tools/post_index.py --from 2024-10-01 --to 2024-10-31
+  python tools/post_index.py --sort --write-archive
+"""
+import argparse
+import bisect
+import json
+import sys
+from datetime import date, datetime
+from pathlib import Path
+
+from atomicio import Transaction, atomic_write_text
+
+ROOT = Path(__file__).resolve().parents[1]
+POSTS_JSON = ROOT / 'posts' / 'blog-posts.json'
+ARCHIVE_DIR = ROOT / 'posts' / 'archive'
+
+DATE_FORMAT = '%d-%m-%Y'
+
+
+def parse_published(value):
+    """Parse a `DD-MM-YYYY` published string into a date (None if missing or malformed)."""
+    try:
+        return datetime.strptime(value, DATE_FORMAT).date()
+    except (TypeError, ValueError):
+        return None
+
+
+def format_published(d: date):
+    return d.strftime(DATE_FORMAT)
+
+
+def _sort_key(post):
+    # Undated posts sort as the oldest
+    d = parse_published(post.get('published'))
+    return -(d.toordinal() if d else 0)
+
+
+def sort_posts(posts):
+    """Return posts newest first. The sort is stable, so same-day posts keep their relative order."""
+    return sorted(posts, key=_sort_key)
+
+
+class PostIndex:
+    """Posts ordered newest first, with O(log n) lookups by date."""
+
+    def __init__(self, posts):
+        self.posts = sort_posts(posts)
+        # Negated ordinals: ascending, so `bisect` works on a newest-first list
+        self._keys = [_sort_key(p) for p in self.posts]
+
+    def __len__(self):
+        return len(self.posts)
+
+    def insert(self, post):
+        """Insert `post` at its date position, ahead of existing posts from the same day. Returns the index."""
+        key = _sort_key(post)
+        i = bisect.bisect_left(self._keys, key)
+        self._keys.insert(i, key)
+        self.posts.insert(i, post)
+        return i
+
+    def between(self, start: date, end: date):
+        """Posts published on or between `start` and `end` (inclusive), newest first."""
+        lo = bisect.bisect_left(self._keys, -end.toordinal())
+        hi = bisect.bisect_right(self._keys, -start.toordinal())
+        return self.posts[lo:hi]
+
+    def year(self, year: int):
+        return self.between(date(year, 1, 1), date(year, 12, 31))
+
+    def month(self, year: int, month: int):
+        last = (date(year + (month == 12), month % 12 + 1, 1) - date.resolution)
+        return self.between(date(year, month, 1), last)
+
+    def years(self):
+        """Distinct years, newest first."""
+        out = []
+        for p in self.posts:
+            d = parse_published(p.get('published'))
+            if d and (not out or out[-1] != d.year):
+                out.append(d.year)
+        return out
+
+
+def write_archive_shards(index: PostIndex, out_dir: Path = ARCHIVE_DIR, txn=None):
+    """Write posts/archive/<year>.json plus index.json. Returns the list of files actually rewritten.
+
+    With `txn` (tools/atomicio.py) the writes and removals are staged in that transaction.
+    """
+    written = []
+    write_text = txn.write_text if txn is not None else atomic_write_text
+
+    def write_if_changed(path: Path, data):
+        text = json.dumps(data, indent=2, ensure_ascii=False)
+        if path.exists() and path.read_text(encoding='utf-8') == text:
+            return
+        write_text(path, text)
+        written.append(path)
+
+    years = index.years()
+    summary = []
+    for year in years:
+        posts = [dict(p, date=parse_published(p['published']).isoformat()) for p in index.year(year)]
+        shard = out_dir / f'{year}.json'
+        write_if_changed(shard, {'year': year, 'posts': posts})
+        summary.append({'year': year, 'count': len(posts), 'url': shard.relative_to(ROOT).as_posix()})
+    write_if_changed(out_dir / 'index.json', summary)
+
+    # Remove shards for years that no longer have posts
+    for stale in out_dir.glob('*.json'):
+        if stale.stem.isdigit() and int(stale.stem) not in years:
+            if txn is not None:
+                txn.remove(stale)
+            else:
+                stale.unlink()
+            written.append(stale)
+    return written
+
+
+def save_posts(data, txn=None, path: Path = POSTS_JSON):
+    """Write blog-posts.json, its .bak and the archive shards, staged together in `txn`.
+
+    Without `txn` they are committed in a transaction of their own. Saving the site's own
+    blog-posts.json also refreshes the sitemap, feeds and search index (tools/build_feeds.py).
+    """
+    if txn is None:
+        with Transaction() as txn:
+            return save_posts(data, txn, path)
+    if path.exists():
+        txn.write_text(path.parent / (path.name + '.bak'), path.read_text(encoding='utf-8'))
+    txn.write_json(path, data)
+    write_archive_shards(PostIndex(data.get('posts', [])), path.parent / 'archive', txn=txn)
+    if path == POSTS_JSON:
+        # Imported here: build_feeds imports this module
+        from build_feeds import write_feeds
+        write_feeds(data, txn)
+
+
+def load_index():
+    data = json.loads(POSTS_JSON.read_text(encoding='utf-8'))
+    return data, PostIndex(data.get('posts', []))
+
+
+def _parse_iso(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Query and maintain the date order of posts/blog-posts.json')
+    parser.add_argument('--year', type=int, default=None, help='List posts from this year')
+    parser.add_argument('--month', default=None, help='List posts from this month (YYYY-MM)')
+    parser.add_argument('--from', dest='start', type=_parse_iso, default=None, help='List posts on or after this date (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='end', type=_parse_iso, default=None, help='List posts on or before this date (YYYY-MM-DD)')
+    parser.add_argument('--sort', action='store_true', help='Rewrite posts/blog-posts.json newest first')
+    parser.add_argument('--write-archive', action='store_true', help='Write per-year archive shards to posts/archive/')
+    args = parser.parse_args(argv)
+
+    data, index = load_index()
+
+    results = None
+    if args.year:
+        results = index.year(args.year)
+    elif args.month:
+        y, m = (int(x) for x in args.month.split('-', 1))
+        results = index.month(y, m)
+    elif args.start or args.end:
+        results = index.between(args.start or date.min, args.end or date.max)
+    if results is not None:
+        for p in results:
+            print(f"{p.get('published')}  {p.get('title')}  ({p.get('link')})")
+        print(f'{len(results)} post(s)')
+
+    if args.sort:
+        if data.get('posts') != index.posts:
+            data['posts'] = index.posts
+            save_posts(data)
+            print('Sorted', POSTS_JSON)
+        else:
+            print('Posts already in date order')
+
+    if args.write_archive:
+        written = write_archive_shards(index)
+        print(f'Archive: {len(index.years())} year shard(s), {len(written)} file(s) updated')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Write precompressed `.gz` and `.br` siblings for the site's text assets.
+
+Every HTML/CSS/JS/JSON/XML/SVG file served by the static site gets a gzip (level 9,
+reproducible: no timestamp) and, if the `brotli` package is installed, a brotli
+(quality 11) sibling next to it, e.g. `styles.css.gz` and `styles.css.br`. A compressed
+variant is only kept when it is actually smaller than the original.
+
+The run is incremental: tools/precompress-manifest.json records the sha256 of each source
+together with the variants written for it, and files whose hash has not changed are skipped.
+Compression runs on a process pool.
+
+server.js serves these siblings when the client's Accept-Encoding allows it, so the bytes are
+compressed once at build time instead of on every request.
+
+`--root` picks the tree to compress (default: the repo root). To precompress a site build,
+run it on the build output after `build`:
+  python tools build
+  python tools precompress --root dist
+Each root keeps its own manifest, tools/precompress-manifest.json for the repo root and
+tools/precompress-manifest-<root>.json otherwise.
+
+Usage:
+  python tools/precompress.py [--root dist] [--workers 4] [--force] [--no-brotli] [--min-bytes 256]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from atomicio import atomic_write_bytes, atomic_write_json
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except Exception:
+    BROTLI_AVAILABLE = False
+
+ROOT = Path(__file__).resolve().parents[1]
+MANIFEST = ROOT / 'tools' / 'precompress-manifest.json'
+
+TEXT_EXT = ('.html', '.css', '.js', '.json', '.xml', '.svg', '.txt', '.map', '.webmanifest')
+# Server-side code, tooling and local backups are never served as static assets. Only
+# subdirectories of --root are skipped, so `--root dist` still compresses the build output.
+SKIP_DIRS = {'.git', 'node_modules', 'backups', 'dist', 'tools', 'routes', 'lib', 'raw-images', 'uploads', 'data', '.venv', 'venv'}
+SKIP_FILES = {'server.js', 'package.json', 'package-lock.json'}
+
+
+def find_assets(root: Path):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS and not d.startswith('.'))
+        for f in sorted(filenames):
+            if f in SKIP_FILES or not f.lower().endswith(TEXT_EXT):
+                continue
+            yield Path(dirpath) / f
+
+
+def _sync_variant(path: Path, suffix: str, data: bytes, original_size: int):
+    """Write (or remove) one compressed sibling. Returns its size, or None if not kept."""
+    dest = path.with_name(path.name + suffix)
+    if len(data) >= original_size:
+        dest.unlink(missing_ok=True)
+        return None
+    atomic_write_bytes(dest, data)
+    return len(data)
+
+
+def manifest_path(root: Path) -> Path:
+    if root == ROOT:
+        return MANIFEST
+    name = root.relative_to(ROOT).as_posix() if root.is_relative_to(ROOT) else root.as_posix()
+    return MANIFEST.with_name(f"precompress-manifest-{name.strip('/').replace('/', '-')}.json")
+
+
+def compress_file(path, use_brotli=True, root: Path = ROOT):
+    """Compress one asset. Returns (path relative to `root`, manifest entry)."""
+    path = Path(path)
+    raw = path.read_bytes()
+    entry = {'sha256': hashlib.sha256(raw).hexdigest(), 'size': len(raw), 'brotli': use_brotli}
+    entry['gz'] = _sync_variant(path, '.gz', gzip.compress(raw, compresslevel=9, mtime=0), len(raw))
+    if use_brotli:
+        entry['br'] = _sync_variant(path, '.br', brotli.compress(raw, quality=11), len(raw))
+    else:
+        path.with_name(path.name + '.br').unlink(missing_ok=True)
+        entry['br'] = None
+    return path.relative_to(root).as_posix(), entry
+
+
+def _up_to_date(path: Path, entry, use_brotli):
+    if not entry or entry.get('brotli') != use_brotli:
+        return False
+    mtime = path.stat().st_mtime_ns
+    for key in ('gz', 'br'):
+        sibling = path.with_name(f'{path.name}.{key}')
+        # server.js ignores a sibling older than its source, so a touched file is rewritten too
+        if entry.get(key) and (not sibling.exists() or sibling.stat().st_mtime_ns < mtime):
+            return False
+    return hashlib.sha256(path.read_bytes()).hexdigest() == entry.get('sha256')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write .gz/.br siblings for static text assets')
+    parser.add_argument('--root', default='.', help='Tree to compress, relative to the repo root (e.g. dist after `build`)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='Recompress everything, ignoring the manifest')
+    parser.add_argument('--no-brotli', dest='brotli', action='store_false', help='Only write .gz files')
+    parser.add_argument('--min-bytes', type=int, default=256, help='Skip files smaller than this')
+    args = parser.parse_args(argv)
+
+    use_brotli = args.brotli and BROTLI_AVAILABLE
+    if args.brotli and not BROTLI_AVAILABLE:
+        print('brotli not installed — only writing .gz files (pip install brotli to enable)')
+
+    root = (ROOT / args.root).resolve()
+    if not root.is_dir():
+        print(f'{root} does not exist' + (' — run `python tools build` first' if args.root.rstrip('/') == 'dist' else ''))
+        return 1
+    manifest_file = manifest_path(root)
+    try:
+        manifest = {} if args.force else json.loads(manifest_file.read_text(encoding='utf-8'))
+    except Exception:
+        manifest = {}
+
+    assets = [p for p in find_assets(root) if p.stat().st_size >= args.min_bytes]
+    todo = [p for p in assets if not _up_to_date(p, manifest.get(p.relative_to(root).as_posix()), use_brotli)]
+    print(f'Found {len(assets)} text asset(s); {len(todo)} changed since last run')
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=args.workers or os.cpu_count() or 1) as pool:
+            for rel, entry in pool.map(compress_file, todo, [use_brotli] * len(todo), [root] * len(todo), chunksize=4):
+                manifest[rel] = entry
+                sizes = ', '.join(f"{k} {entry[k]}" for k in ('gz', 'br') if entry.get(k))
+                print(f"Compressed {rel}: {entry['size']} -> {sizes or 'not smaller, skipped'}")
+
+    # Drop entries (and siblings) for assets that were removed or fell under --min-bytes
+    live = {p.relative_to(root).as_posix() for p in assets}
+    for rel in sorted(set(manifest) - live):
+        for suffix in ('.gz', '.br'):
+            (root / (rel + suffix)).unlink(missing_ok=True)
+        del manifest[rel]
+
+    atomic_write_json(manifest_file, dict(sorted(manifest.items())))
+    total = sum(e['size'] for e in manifest.values())
+    total_gz = sum(e.get('gz') or e['size'] for e in manifest.values())
+    print(f'Wrote {manifest_file.relative_to(ROOT)}: {total} bytes raw, {total_gz} bytes gzip')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
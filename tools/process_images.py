@@ -4,6 +4,7 @@ Process images to create thumbnails and webp variants, strip EXIF, and optionall
 
 Usage:
   python tools/process_images.py --source blog-images --dest blog-images/thumbs --sizes 800 400 --webp --update-json
+  python tools/process_images.py --placeholders-only
 
 Defaults:
   source: blog-images
@@ -11,9 +12,23 @@ Defaults:
   sizes: 800 400
   webp: enabled
   update-json: enabled
+  placeholders: enabled
 
 The script writes tools/process-map.json with mapping info.
+
+For every image it also precomputes a placeholder that scripts/post-meta.js and index.html paint
+while the real image loads: `lqip` (a 16px WebP as a base64 data URI, a few hundred bytes),
+`color` (the dominant colour) and the upright `width`/`height`. These are written into
+blog-posts.json and cached by the source's sha256 in tools/placeholder-cache.json.
+
+Outputs are committed in batches (see tools/atomicio.py `Transaction`): every --batch images the
+staged thumbnails are fsynced and renamed into place, and progress is recorded in
+tools/process-journal.json. If a run is interrupted, rerunning the same command skips the images
+that were already committed (unless their source changed); the thumbnails of the unfinished batch,
+process-map.json and blog-posts.json are never left half-written.
 """
+import base64
+import io
 import os
 import sys
 from pathlib import Path
@@ -21,7 +36,17 @@ from PIL import Image, ImageOps
 import argparse
 import json
 
+from atomicio import Transaction, atomic_save_image
+from image_meta import MetaCache, sha256_bytes
+from post_index import save_posts
+
 ROOT = Path(__file__).resolve().parents[1]
+JOURNAL = ROOT / 'tools' / 'process-journal.json'
+PLACEHOLDER_CACHE = ROOT / 'tools' / 'placeholder-cache.json'
+# Bump when the placeholder format changes so cached entries are recomputed
+PLACEHOLDER_VERSION = 1
+LQIP_SIZE = 16
+PLACEHOLDER_FIELDS = ('lqip', 'color', 'width', 'height')
 
 VALID_EXT = ('.jpg', '.jpeg', '.png', '.gif', '.bmp')
 
@@ -33,53 +58,212 @@ def ensure_dir(p: Path):
 from PIL import ImageFilter
 
 
-def process_image(src: Path, dest_dir: Path, sizes=(1600, 800, 400), make_webp=True, quality_map=None, watermark_text=None):
+def resize_variant(im, size):
+    """The `size` px variant of a decoded image: fitted into size x size, RGB and lightly sharpened."""
+    # Compute target size while preserving aspect
+    w, h = im.size
+    # Use high-quality Lanczos resampling for downscaling
+    if w <= size and h <= size:
+        resized = im
+    else:
+        # Pillow supports a 'method' argument for contain; use LANCZOS for quality
+        try:
+            resized = ImageOps.contain(im, (size, size), method=Image.LANCZOS)
+        except TypeError:
+            # Older Pillow versions may not accept 'method' keyword; fall back
+            resized = ImageOps.contain(im, (size, size))
+    if resized.mode != 'RGB':
+        # e.g. the RGBX master shared by tools/pipeline.py; only the resized copy is converted
+        resized = resized.convert('RGB')
+    # Apply light sharpening (unsharp mask) to improve perceived sharpness after downscale
+    try:
+        resized = resized.filter(ImageFilter.UnsharpMask(radius=0.5, percent=120, threshold=3))
+    except Exception:
+        pass
+    return resized
+
+
+def render_variants(im, base: str, dest_dir: Path, sizes=(1600, 800, 400), make_webp=True, quality_map=None, txn=None, fsync=False):
+    """Resize and encode an already-decoded RGB (or RGBX) image into `<base>-<size>.jpg/.webp` under dest_dir.
+
+    This is the resize/encode stage of the pipeline: it never touches the source file, so callers that
+    already hold an Image (e.g. the watermark stage in tools/pipeline.py) can hand it over without a
+    round-trip through disk. Outputs are written via temp-file + rename (flushed to disk with `fsync`,
+    for callers that checkpoint them), or staged in `txn` if given.
+    """
+    if txn is not None:
+        save = txn.save_image
+    else:
+        def save(image, dest, **kwargs):
+            atomic_save_image(image, dest, fsync=fsync, **kwargs)
+    results = {}
+    for size in sizes:
+        resized = resize_variant(im, size)
+        dest_name = f"{base}-{size}.jpg"
+        dest_path = dest_dir / dest_name
+
+        # Determine quality for this size (allow per-size tuning)
+        q = quality_map.get(size) if quality_map and isinstance(quality_map, dict) else (quality_map or 92)
+        # Strip EXIF by not copying exif info; save with progressive JPEG and optimization
+        save(resized, dest_path, format='JPEG', quality=int(q), optimize=True, progressive=True)
+        results[size] = str(dest_path.relative_to(ROOT))
+
+        if make_webp:
+            webp_name = f"{base}-{size}.webp"
+            webp_path = dest_dir / webp_name
+            # WebP tends to give better quality/size than JPEG; keep quality slightly lower
+            webp_q = 90 if q >= 90 else 85
+            save(resized, webp_path, format='WEBP', quality=int(webp_q), method=6)
+            results[f'{size}_webp'] = str(webp_path.relative_to(ROOT))
+    return results
+
+
+def process_image(src: Path, dest_dir: Path, sizes=(1600, 800, 400), make_webp=True, quality_map=None, watermark_text=None, txn=None, fsync=False):
     results = {}
     try:
         with Image.open(src) as im:
-            im = im.convert('RGB')
-            for size in sizes:
-                # Compute target size while preserving aspect
-                w, h = im.size
-                # Use high-quality Lanczos resampling for downscaling
-                if w <= size and h <= size:
-                    resized = im.copy()
-                else:
-                    # Pillow supports a 'method' argument for contain; use LANCZOS for quality
-                    try:
-                        resized = ImageOps.contain(im, (size, size), method=Image.LANCZOS)
-                    except TypeError:
-                        # Older Pillow versions may not accept 'method' keyword; fall back
-                        resized = ImageOps.contain(im, (size, size))
-
-                base = src.stem
-                dest_name = f"{base}-{size}.jpg"
-                dest_path = dest_dir / dest_name
-                # Apply light sharpening (unsharp mask) to improve perceived sharpness after downscale
-                try:
-                    resized = resized.filter(ImageFilter.UnsharpMask(radius=0.5, percent=120, threshold=3))
-                except Exception:
-                    pass
-
-                # Determine quality for this size (allow per-size tuning)
-                q = quality_map.get(size) if quality_map and isinstance(quality_map, dict) else (quality_map or 92)
-                # Strip EXIF by not copying exif info; save with progressive JPEG and optimization
-                resized.save(dest_path, format='JPEG', quality=int(q), optimize=True, progressive=True)
-                results[size] = str(dest_path.relative_to(ROOT))
-
-                if make_webp:
-                    webp_name = f"{base}-{size}.webp"
-                    webp_path = dest_dir / webp_name
-                    # WebP tends to give better quality/size than JPEG; keep quality slightly lower
-                    webp_q = 90 if q >= 90 else 85
-                    resized.save(webp_path, format='WEBP', quality=int(webp_q), method=6)
-                    results[f'{size}_webp'] = str(webp_path.relative_to(ROOT))
+            # Apply EXIF orientation to the decoded pixels; the outputs carry no EXIF to do it later
+            im = ImageOps.exif_transpose(im).convert('RGB')
+            results = render_variants(im, src.stem, dest_dir, sizes=sizes, make_webp=make_webp, quality_map=quality_map, txn=txn, fsync=fsync)
     except Exception as e:
         print(f"Failed to process {src}: {e}")
     return results
 
 
-def main():
+def compute_placeholder(im, size=None):
+    """LQIP data URI, dominant colour and size for a decoded (upright) image.
+
+    Everything runs as whole-image operations inside Pillow: a box-filtered 64px copy is
+    median-cut into a few colours and the most frequent one is taken as the dominant colour,
+    and the same copy is shrunk to LQIP_SIZE px for the WebP preview. `size` is the full
+    upright size if `im` was decoded at reduced scale.
+    """
+    # Integer box reduction first, so a full-size master is never copied at full resolution
+    factor = max(1, min(im.size) // 128)
+    small = (im.reduce(factor) if factor > 1 else im).convert('RGB')
+    small.thumbnail((64, 64), Image.BOX)
+    quantize = getattr(Image, 'Quantize', Image)
+    q = small.quantize(colors=5, method=quantize.MEDIANCUT)
+    _, index = max(q.getcolors())
+    r, g, b = q.getpalette()[index * 3:index * 3 + 3]
+
+    tiny = small.copy()
+    tiny.thumbnail((LQIP_SIZE, LQIP_SIZE), Image.BOX)
+    buf = io.BytesIO()
+    tiny.save(buf, format='WEBP', quality=40, method=6)
+    width, height = size or im.size
+    return {
+        'lqip': 'data:image/webp;base64,' + base64.b64encode(buf.getvalue()).decode('ascii'),
+        'color': f'#{r:02x}{g:02x}{b:02x}',
+        'width': width,
+        'height': height,
+    }
+
+
+def load_placeholder_cache():
+    return MetaCache(PLACEHOLDER_CACHE, version=PLACEHOLDER_VERSION)
+
+
+def placeholder_for(src: Path, cache: MetaCache = None):
+    """Placeholder fields for `src`, from the cache when its content hash is known.
+
+    On a miss the JPEG is decoded at reduced scale (draft mode), which is far cheaper than a
+    full decode; only the header is needed for the full size.
+    """
+    raw = Path(src).read_bytes()
+    digest = sha256_bytes(raw)
+    entry = cache.get(digest) if cache is not None else None
+    if entry is None:
+        with Image.open(io.BytesIO(raw)) as im:
+            w, h = im.size
+            # EXIF orientations 5-8 are rotated by 90 degrees
+            if im.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+                w, h = h, w
+            im.draft('RGB', (128, 128))
+            entry = compute_placeholder(ImageOps.exif_transpose(im), size=(w, h))
+        if cache is not None:
+            cache.put(digest, entry)
+    return entry
+
+
+def apply_placeholders(data, placeholders):
+    """Copy placeholder fields (keyed by image filename) into the posts in `data`. Returns True if changed."""
+    changed = False
+    for post in data.get('posts', []):
+        img = post.get('image')
+        entry = placeholders.get(os.path.basename(img)) if img else None
+        if not entry:
+            continue
+        for key in PLACEHOLDER_FIELDS:
+            if post.get(key) != entry[key]:
+                post[key] = entry[key]
+                changed = True
+    return changed
+
+
+def restore_sizes(entry):
+    # JSON object keys are strings; render_variants keys plain sizes by int
+    return {int(k) if k.isdigit() else k: v for k, v in entry.items()}
+
+
+def _resume_key(src: Path):
+    st = src.stat()
+    return f'{src.name}:{st.st_size}:{st.st_mtime_ns}'
+
+
+def apply_mapping(data, mapping, sizes):
+    """Point each post's thumb/hero in `data` at the variants listed in `mapping`. Returns True if changed."""
+    changed = False
+    for post in data.get('posts', []):
+        img = post.get('image')
+        if not img:
+            continue
+        # image path like "../blog-images/filename.jpg"
+        fname = os.path.basename(img)
+        entry = mapping.get(fname)
+        if entry:
+            # Choose a sensible default: if multiple sizes were requested, use the second size as the
+            # normal thumbnail (e.g., sizes = [1600,800,400] -> thumb=800) and keep the largest as 'hero'.
+            preferred = sizes[1] if len(sizes) > 1 else sizes[0]
+            hero = sizes[0]
+            thumb_rel = entry.get(preferred)
+            hero_rel = entry.get(hero)
+            if thumb_rel:
+                post['thumb'] = '../' + thumb_rel.replace('\\', '/')
+                changed = True
+                print(f"Updated post thumb for {fname} -> {post['thumb']}")
+            if hero_rel:
+                post['hero'] = '../' + hero_rel.replace('\\', '/')
+                print(f"Updated post hero for {fname} -> {post['hero']}")
+    return changed
+
+
+def update_posts_json(mapping, sizes, txn=None, placeholders=None):
+    """Point each post's thumb/hero at the variants listed in `mapping` (as returned by process_image).
+
+    `placeholders` (filename -> placeholder_for() result) fills the placeholder fields as well.
+    The backup, the updated JSON and the archive shards are staged in `txn` (or a transaction of
+    their own) and land together.
+    """
+    if txn is None:
+        with Transaction() as txn:
+            return update_posts_json(mapping, sizes, txn, placeholders)
+    posts_json = ROOT / 'posts' / 'blog-posts.json'
+    if not posts_json.exists():
+        print('Posts JSON not found, skipping JSON update')
+        return
+    data = json.loads(posts_json.read_text(encoding='utf-8'))
+    changed = apply_mapping(data, mapping, sizes)
+    if placeholders:
+        changed = apply_placeholders(data, placeholders) or changed
+    if changed:
+        save_posts(data, txn, posts_json)
+        print('Updated', posts_json)
+    else:
+        print('No posts updated')
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument('--source', default='blog-images', help='Source directory relative to repo root')
     parser.add_argument('--dest', default='blog-images/thumbs', help='Destination directory for thumbs')
@@ -89,7 +273,11 @@ def main():
     parser.add_argument('--quality', type=int, default=92, help='Default JPEG quality for outputs (applies when quality-map not used)')
     parser.add_argument('--quality-map', type=str, default=None, help='JSON map of size->quality, e.g. "{\"1600\":92,\"800\":90,\"400\":85}"')
     parser.add_argument('--watermark', default=None, help='Optional watermark text to apply to generated images')
-    args = parser.parse_args()
+    parser.add_argument('--file', default=None, help='Only process this filename from the source directory')
+    parser.add_argument('--batch', type=int, default=25, help='Commit outputs and record progress every N images')
+    parser.add_argument('--no-placeholders', dest='placeholders', action='store_false', help='Do not compute LQIP/dominant-colour placeholders')
+    parser.add_argument('--placeholders-only', action='store_true', help='Only compute placeholders and write them to posts/blog-posts.json')
+    args = parser.parse_args(argv)
 
     source_dir = ROOT / args.source
     dest_dir = ROOT / args.dest
@@ -99,61 +287,65 @@ def main():
     ensure_dir(dest_dir)
 
     mapping = {}
+    placeholders = {}
+    placeholder_cache = load_placeholder_cache() if args.placeholders else None
     files = [p for p in source_dir.iterdir() if p.is_file() and p.suffix.lower() in VALID_EXT]
+    if args.file:
+        files = [p for p in files if p.name == args.file]
     print(f'Found {len(files)} image(s) in {source_dir}')
-    for f in files:
-        print('Processing', f.name)
-        qmap = None
-        if args.quality_map:
+
+    if args.placeholders_only:
+        placeholder_cache = load_placeholder_cache()
+        for f in files:
             try:
-                qmap = json.loads(args.quality_map)
-                # convert keys to ints
-                qmap = {int(k): int(v) for k, v in qmap.items()}
-            except Exception:
-                qmap = None
-        res = process_image(f, dest_dir, sizes=args.sizes, make_webp=args.webp, quality_map=qmap or args.quality, watermark_text=args.watermark)
-        mapping[f.name] = res
-
-    # Write mapping
-    map_file = ROOT / 'tools' / 'process-map.json'
-    map_file.write_text(json.dumps(mapping, indent=2), encoding='utf-8')
-    print('Wrote mapping to', map_file)
-
-    if args.update_json:
-        posts_json = ROOT / 'posts' / 'blog-posts.json'
-        if not posts_json.exists():
-            print('Posts JSON not found, skipping JSON update')
-            return
-        data = json.loads(posts_json.read_text(encoding='utf-8'))
-        changed = False
-        for post in data.get('posts', []):
-            img = post.get('image')
-            if not img:
+                placeholders[f.name] = placeholder_for(f, placeholder_cache)
+            except Exception as e:
+                print(f'Failed to compute placeholder for {f.name}: {e}')
+        placeholder_cache.save()
+        update_posts_json({}, args.sizes, placeholders=placeholders)
+        return
+    # Progress recorded under different options does not apply to this run
+    fingerprint = [args.source, args.dest, args.sizes, args.webp, args.quality, args.quality_map]
+    with Transaction(JOURNAL, commit_every=args.batch, fingerprint=fingerprint) as txn:
+        if txn.completed:
+            print(f'Resuming: {len(txn.completed)} image(s) already processed by an interrupted run')
+        for f in files:
+            key = _resume_key(f)
+            if key in txn.completed:
+                mapping[f.name] = restore_sizes(txn.completed[key])
                 continue
-            # image path like "../blog-images/filename.jpg"
-            fname = os.path.basename(img)
-            entry = mapping.get(fname)
-            if entry:
-                # Choose a sensible default: if multiple sizes were requested, use the second size as the
-                # normal thumbnail (e.g., sizes = [1600,800,400] -> thumb=800) and keep the largest as 'hero'.
-                preferred = args.sizes[1] if len(args.sizes) > 1 else args.sizes[0]
-                hero = args.sizes[0]
-                thumb_rel = mapping[fname].get(preferred)
-                hero_rel = mapping[fname].get(hero)
-                if thumb_rel:
-                    post['thumb'] = '../' + thumb_rel.replace('\\', '/')
-                    changed = True
-                    print(f"Updated post thumb for {fname} -> {post['thumb']}")
-                if hero_rel:
-                    post['hero'] = '../' + hero_rel.replace('\\', '/')
-                    print(f"Updated post hero for {fname} -> {post['hero']}")
-        if changed:
-            # backup
-            (posts_json.parent / 'blog-posts.json.bak').write_text(posts_json.read_text(encoding='utf-8'), encoding='utf-8')
-            posts_json.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding='utf-8')
-            print('Updated', posts_json)
-        else:
-            print('No posts updated')
+            print('Processing', f.name)
+            qmap = None
+            if args.quality_map:
+                try:
+                    qmap = json.loads(args.quality_map)
+                    # convert keys to ints
+                    qmap = {int(k): int(v) for k, v in qmap.items()}
+                except Exception:
+                    qmap = None
+            res = process_image(f, dest_dir, sizes=args.sizes, make_webp=args.webp, quality_map=qmap or args.quality, watermark_text=args.watermark, txn=txn)
+            mapping[f.name] = res
+            if res:
+                # A failed image is not checkpointed, so a resumed run retries it
+                txn.done(key, res)
+
+        if placeholder_cache is not None:
+            # Cached by content hash, so images skipped above cost one read each
+            for f in files:
+                try:
+                    placeholders[f.name] = placeholder_for(f, placeholder_cache)
+                except Exception as e:
+                    print(f'Failed to compute placeholder for {f.name}: {e}')
+            placeholder_cache.save()
+
+        # Write mapping
+        map_file = ROOT / 'tools' / 'process-map.json'
+        txn.write_text(map_file, json.dumps(mapping, indent=2))
+        print('Wrote mapping to', map_file)
+
+        if args.update_json:
+            update_posts_json(mapping, args.sizes, txn=txn, placeholders=placeholders)
+
 
 if __name__ == '__main__':
     main()
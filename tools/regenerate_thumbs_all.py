@@ -1,58 +1,252 @@
-git pull
+#!/usr/bin/env python3
+"""
+Regenerate the thumbnails of every post from its original image.
+
+For each post in posts/blog-posts.json the source is looked up in tools/_water_tmp/, then
+raw-images/, then blog-images/, and its variants are rendered into blog-images/thumbs/ on a
+worker pool (tools/process_images.py).
+
+The run is checkpointed: every finished image is recorded in a journal
+(tools/regen-<i>-of-<N>-journal.json, see tools/atomicio.py `Transaction`), so an interrupted
+run picks up where it stopped instead of starting over. Images whose source changed since they
+were recorded are redone.
+
+The work can be split across machines or CI jobs with `--shard i/N` (1 <= i <= N). Images are
+assigned to shards by a hash of their filename, so the split does not depend on post order.
+Each run writes its results to tools/regen-results/shard-<i>-of-<N>.json; `--merge --shards N`
+combines them (sorted by filename, so the output does not depend on which job finished first)
+into tools/regen-map.json and commits the thumbnails.
+
+The merge runs in one checkout, so every shard job has to hand over both its results file and
+its rendered blog-images/thumbs/ files (e.g. as CI artifacts unpacked into the merging job's
+tree). `--merge` refuses to write the map, update the JSON or commit while any output listed
+in the results is missing locally.
+
+Usage:
+  python tools/regenerate_thumbs_all.py                          # everything, then git commit
+  python tools/regenerate_thumbs_all.py --shard 2/4 --workers 8  # one CI job of four
+  python tools/regenerate_thumbs_all.py --merge --shards 4       # after all four jobs
+"""
+import argparse
+import hashlib
 import json
 import os
 import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
+from atomicio import Transaction, atomic_write_json
+from process_images import process_image, restore_sizes, update_posts_json
+
 ROOT = Path(__file__).resolve().parents[1]
-posts_json = ROOT / 'posts' / 'blog-posts.json'
-if not posts_json.exists():
-    print('posts/blog-posts.json not found')
-    raise SystemExit(1)
-
-data = json.loads(posts_json.read_text(encoding='utf-8'))
-processed = []
-skipped = []
-
-for post in data.get('posts', []):
-    img = post.get('image')
-    if not img:
-        skipped.append((post.get('title'), None, 'no image'))
-        continue
-    fname = os.path.basename(img)
+POSTS_JSON = ROOT / 'posts' / 'blog-posts.json'
+RESULTS_DIR = ROOT / 'tools' / 'regen-results'
+REGEN_MAP = ROOT / 'tools' / 'regen-map.json'
+COMMIT_MSG = 'Regenerate all thumbnails from originals (remove watermark)'
+
+
+def find_source(fname):
     # Candidate sources in order of preference
-    candidates = [ROOT / 'tools' / '_water_tmp' / fname, ROOT / 'raw-images' / fname, ROOT / 'blog-images' / fname]
-    source = None
-    for c in candidates:
+    for c in (ROOT / 'tools' / '_water_tmp' / fname, ROOT / 'raw-images' / fname, ROOT / 'blog-images' / fname):
         if c.exists():
-            source = c
-            break
-    if source is None:
-        skipped.append((post.get('title'), fname, 'no source found'))
-        continue
-    # Determine source dir relative to ROOT
-    source_dir = os.path.relpath(source.parent, ROOT)
-    print(f'Using source {source_dir} for {fname}')
-    cmd = ['python', str(ROOT / 'tools' / 'process_images.py'), '--source', source_dir, '--dest', 'blog-images/thumbs', '--file', fname, '--no-update-json']
+            return c
+    return None
+
+
+def plan(posts):
+    """Return ([(fname, source), ...] sorted by fname, [(title, fname, reason), ...] skipped)."""
+    items = {}
+    skipped = []
+    for post in posts:
+        img = post.get('image')
+        if not img:
+            skipped.append((post.get('title'), None, 'no image'))
+            continue
+        fname = os.path.basename(img)
+        source = find_source(fname)
+        if source is None:
+            skipped.append((post.get('title'), fname, 'no source found'))
+            continue
+        items[fname] = source
+    return sorted(items.items()), skipped
+
+
+def shard_of(fname, count):
+    """1-based shard for `fname`. Stable across runs, machines and post order."""
+    return int(hashlib.sha1(fname.encode('utf-8')).hexdigest(), 16) % count + 1
+
+
+def parse_shard(value):
     try:
-        subprocess.check_call(cmd)
-        processed.append((post.get('title'), fname, source_dir))
-    except subprocess.CalledProcessError as e:
-        skipped.append((post.get('title'), fname, f'process failed: {e}'))
-
-print('\nProcessed:')
-for p in processed:
-    print(' -', p)
-print('\nSkipped:')
-for s in skipped:
-    print(' -', s)
-
-# After processing, stage the thumbnails
-subprocess.call(['git', 'add', 'blog-images/thumbs'])
-
-if processed:
-    commit_msg = 'Regenerate all thumbnails from originals (remove watermark)'
-    subprocess.call(['git', 'commit', '-m', commit_msg])
+        index, count = (int(x) for x in value.split('/', 1))
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected i/N, e.g. 2/4')
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError('shard index must be between 1 and N')
+    return index, count
+
+
+def checkpoint_key(fname, source: Path):
+    st = source.stat()
+    return f'{fname}:{st.st_size}:{st.st_mtime_ns}'
+
+
+def regenerate(items, dest_dir: Path, sizes, make_webp, quality, workers, journal: Path, fingerprint, checkpoint_every=1):
+    """Render every (fname, source) in `items`, skipping those already recorded in `journal`.
+
+    Returns (results, failed): results maps fname -> {'source': ..., 'outputs': {...}}.
+    """
+    results = {}
+    failed = []
+    with Transaction(journal, commit_every=checkpoint_every, fingerprint=fingerprint) as txn:
+        todo = []
+        for fname, source in items:
+            key = checkpoint_key(fname, source)
+            if key in txn.completed:
+                results[fname] = txn.completed[key]
+            else:
+                todo.append((key, fname, source))
+        if results:
+            print(f'Resuming: {len(results)} image(s) already done, {len(todo)} to go')
+
+        pool = ProcessPoolExecutor(max_workers=workers)
+        try:
+            # Workers fsync their outputs, so an image is on disk before the journal calls it done
+            futures = {pool.submit(process_image, source, dest_dir, sizes=sizes, make_webp=make_webp,
+                                   quality_map=quality, fsync=True): (key, fname, source)
+                       for key, fname, source in todo}
+            for fut in as_completed(futures):
+                key, fname, source = futures[fut]
+                try:
+                    outputs = fut.result()
+                except Exception as e:
+                    outputs = {}
+                    print(f'Failed to process {fname}: {e}')
+                if not outputs:
+                    # Not checkpointed, so a resumed run retries it
+                    failed.append((fname, str(source.relative_to(ROOT))))
+                    continue
+                entry = {'source': source.parent.relative_to(ROOT).as_posix(),
+                         'outputs': {str(k): v.replace('\\', '/') for k, v in outputs.items()}}
+                results[fname] = entry
+                txn.done(key, entry)
+                print(f'[{len(results)}/{len(items)}] {fname} (from {entry["source"]})')
+        finally:
+            # On Ctrl-C, drop the queued images instead of rendering them all before exiting
+            pool.shutdown(cancel_futures=True)
+        if failed:
+            # Keep the journal: the images that did finish are skipped next time
+            txn.commit()
+            raise SystemExit(f'{len(failed)} image(s) failed; rerun the same command to retry them')
+    return dict(sorted(results.items())), failed
+
+
+def shard_results_path(index, count):
+    return RESULTS_DIR / f'shard-{index}-of-{count}.json'
+
+
+def merge_shards(count):
+    """Combine the results of shards 1..count. Returns (results sorted by fname, missing shard indexes)."""
+    merged = {}
+    missing = []
+    for i in range(1, count + 1):
+        path = shard_results_path(i, count)
+        if not path.exists():
+            missing.append(i)
+            continue
+        data = json.loads(path.read_text(encoding='utf-8'))
+        for fname, entry in data['results'].items():
+            # Shards are disjoint; if a file shows up twice the lowest shard wins, so the result is stable
+            merged.setdefault(fname, entry)
+    return dict(sorted(merged.items())), missing
+
+
+def missing_outputs(results):
+    """Output paths listed in `results` that do not exist in this checkout, sorted."""
+    return sorted(rel for entry in results.values() for rel in entry['outputs'].values()
+                  if not (ROOT / rel).exists())
+
+
+def git_commit():
+    subprocess.call(['git', 'add', 'blog-images/thumbs'])
+    subprocess.call(['git', 'commit', '-m', COMMIT_MSG])
     print('Committed thumbnails')
-else:
-    print('No thumbnails processed; nothing committed')
+
+
+def write_map(results, sizes, update_json):
+    atomic_write_json(REGEN_MAP, results)
+    print('Wrote mapping to', REGEN_MAP)
+    if update_json:
+        update_posts_json({fname: restore_sizes(e['outputs']) for fname, e in results.items()}, sizes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Regenerate every post thumbnail from its original, resumably')
+    parser.add_argument('--dest', default='blog-images/thumbs', help='Destination directory for thumbs')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1600, 800, 400], help='Sizes (px) to generate')
+    parser.add_argument('--no-webp', dest='webp', action='store_false', help='Do not create webp variants')
+    parser.add_argument('--quality', type=int, default=92, help='JPEG quality for outputs')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--checkpoint-every', type=int, default=1, help='Record progress every N images')
+    parser.add_argument('--shard', type=parse_shard, default=(1, 1), help='Only process shard i of N (e.g. 2/4)')
+    parser.add_argument('--merge', action='store_true', help='Merge the results of all shards instead of processing')
+    parser.add_argument('--shards', type=int, default=None, help='With --merge: number of shards to expect')
+    parser.add_argument('--update-json', action='store_true', help='Point thumb/hero in posts/blog-posts.json at the results')
+    parser.add_argument('--no-commit', dest='commit', action='store_false', help='Do not git commit the thumbnails')
+    args = parser.parse_args(argv)
+
+    if args.merge:
+        count = args.shards or args.shard[1]
+        results, missing = merge_shards(count)
+        if missing:
+            print('Missing results for shard(s):', ', '.join(map(str, missing)))
+            return 1
+        print(f'Merged {len(results)} image(s) from {count} shard(s)')
+        absent = missing_outputs(results)
+        if absent:
+            print(f'{len(absent)} output(s) listed in the shard results are not in this checkout; '
+                  'copy each shard\'s thumbnails here before merging:')
+            for rel in absent:
+                print(' -', rel)
+            return 1
+        write_map(results, args.sizes, args.update_json)
+        if args.commit and results:
+            git_commit()
+        return 0
+
+    if not POSTS_JSON.exists():
+        print('posts/blog-posts.json not found')
+        return 1
+
+    data = json.loads(POSTS_JSON.read_text(encoding='utf-8'))
+    items, skipped = plan(data.get('posts', []))
+    index, count = args.shard
+    if count > 1:
+        items = [(fname, source) for fname, source in items if shard_of(fname, count) == index]
+        print(f'Shard {index}/{count}: {len(items)} image(s)')
+
+    journal = ROOT / 'tools' / f'regen-{index}-of-{count}-journal.json'
+    fingerprint = [args.dest, args.sizes, args.webp, args.quality]
+    results, _ = regenerate(items, ROOT / args.dest, args.sizes, args.webp, args.quality,
+                            args.workers or os.cpu_count() or 1, journal, fingerprint, args.checkpoint_every)
+
+    atomic_write_json(shard_results_path(index, count), {'shard': [index, count], 'results': results})
+    print(f'\nProcessed: {len(results)} image(s); results in {shard_results_path(index, count).relative_to(ROOT)}')
+    if skipped:
+        print('Skipped:')
+        for s in skipped:
+            print(' -', s)
+
+    # A sharded run leaves committing to the --merge step
+    if count == 1:
+        write_map(results, args.sizes, args.update_json)
+        if args.commit and results:
+            git_commit()
+        elif not results:
+            print('No thumbnails processed; nothing committed')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
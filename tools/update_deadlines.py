@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Refresh award deadlines in awards.json by scraping each award's `latestOpeningEntry` page.
+
+Python counterpart of `tryUpdateDeadlines()` in server.js, built for running from cron/CI:
+- pages are fetched concurrently (bounded by --concurrency) over one pooled aiohttp session
+- conditional requests: ETag / Last-Modified from the previous run are sent back as
+  If-None-Match / If-Modified-Since, and a 304 reuses the date found last time
+- the body is streamed and scanned chunk by chunk; the download stops at the first
+  "Month D, YYYY" date found
+- requests to the same host are spaced at least --host-interval seconds apart
+- awards.json is rewritten (atomically) only when a deadline actually changed
+
+Per-URL fetch state lives in tools/deadline-cache.json, so awards.json itself only changes
+when a deadline does. Pages fetched less than --max-age hours ago are skipped.
+
+Requires aiohttp (`pip install aiohttp`).
+
+Usage:
+  python tools/update_deadlines.py [--awards awards.json] [--concurrency 8] [--host-interval 1.0] [--force] [--dry-run]
+
+To try it against a local stub, point `latestOpeningEntry` in a copy of awards.json at
+e.g. `python -m http.server` and pass `--awards path/to/copy.json --cache path/to/cache.json`.
+"""
+import argparse
+import asyncio
+import codecs
+import json
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from atomicio import atomic_write_json
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except Exception:
+    AIOHTTP_AVAILABLE = False
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_AWARDS = ROOT / 'awards.json'
+DEFAULT_CACHE = ROOT / 'tools' / 'deadline-cache.json'
+
+MONTHS = 'January|February|March|April|May|June|July|August|September|October|November|December'
+DATE_LONG_RE = re.compile(r'\b(%s)\s+\d{1,2},\s*\d{4}\b' % MONTHS, re.I)  # "January 3, 2025"
+DATE_ISO_RE = re.compile(r'\b\d{4}-\d{2}-\d{2}\b')  # "2025-01-03"
+# A match can straddle two chunks; keep this much of the previous text when scanning the next chunk
+OVERLAP = 64
+CHUNK_SIZE = 16 * 1024
+USER_AGENT = 'monoismore-deadline-bot/1.0 (+https://monoismore.com)'
+
+
+def format_iso_date(value: str):
+    try:
+        d = datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        return None
+    return f'{d.strftime("%B")} {d.day}, {d.year}'
+
+
+class DateScanner:
+    """Incremental version of server.js extractDateFromText().
+
+    A long-form date wins wherever it appears, so scanning can stop at the first one; an ISO
+    date is only used if the whole page has no long-form date.
+    """
+
+    def __init__(self):
+        self.tail = ''
+        self.long_date = None
+        self.iso_date = None
+
+    def feed(self, text: str):
+        """Scan the next piece of text. Returns True once the result can no longer change."""
+        buf = self.tail + text
+        m = DATE_LONG_RE.search(buf)
+        if m:
+            self.long_date = m.group(0)
+            return True
+        if self.iso_date is None:
+            for m in DATE_ISO_RE.finditer(buf):
+                formatted = format_iso_date(m.group(0))
+                if formatted:
+                    self.iso_date = formatted
+                    break
+        self.tail = buf[-OVERLAP:]
+        return False
+
+    @property
+    def result(self):
+        return self.long_date or self.iso_date
+
+
+class HostLimiter:
+    """Space out requests to the same host by at least `interval` seconds."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._locks = {}
+        self._next = {}
+
+    async def wait(self, url: str):
+        host = urlsplit(url).netloc.lower()
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            delay = self._next.get(host, 0) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next[host] = time.monotonic() + self.interval
+
+
+async def fetch_deadline(session, url, cached, limiter, semaphore):
+    """Fetch one page and return (found_date_or_None, new_cache_entry)."""
+    headers = {}
+    if cached.get('etag'):
+        headers['If-None-Match'] = cached['etag']
+    if cached.get('lastModified'):
+        headers['If-Modified-Since'] = cached['lastModified']
+
+    entry = dict(cached)
+    entry['fetchedAt'] = datetime.now(timezone.utc).isoformat()
+    # Wait out the per-host interval before taking a connection slot, so URLs queued behind
+    # one host do not hold slots that requests to other hosts could use
+    await limiter.wait(url)
+    async with semaphore:
+        async with session.get(url, headers=headers, allow_redirects=True) as resp:
+            if resp.status == 304:
+                entry['status'] = 304
+                return cached.get('found'), entry
+            entry['status'] = resp.status
+            if resp.status >= 400:
+                return None, entry
+            entry['etag'] = resp.headers.get('ETag')
+            entry['lastModified'] = resp.headers.get('Last-Modified')
+
+            decoder = codecs.getincrementaldecoder(resp.charset or 'utf-8')(errors='replace')
+            scanner = DateScanner()
+            done = False
+            async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                if scanner.feed(decoder.decode(chunk)):
+                    done = True
+                    break
+            if done:
+                # Stop downloading the rest of the page
+                resp.close()
+            else:
+                scanner.feed(decoder.decode(b'', final=True))
+    entry['found'] = scanner.result
+    return scanner.result, entry
+
+
+def _is_fresh(entry, max_age_hours):
+    try:
+        fetched = datetime.fromisoformat(entry['fetchedAt'])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return (datetime.now(timezone.utc) - fetched).total_seconds() < max_age_hours * 3600
+
+
+async def update_awards(awards, cache, concurrency=8, host_interval=1.0, max_age_hours=24, force=False, timeout=20):
+    """Update `awards` in place. Returns a list of (name, old, new) deadline changes; `cache` is updated."""
+    urls = []
+    for award in awards:
+        url = award.get('latestOpeningEntry')
+        if not url or url == 'N/A' or url in urls:
+            continue
+        if not force and _is_fresh(cache.get(url, {}), max_age_hours):
+            continue
+        urls.append(url)
+    if not urls:
+        return []
+
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = HostLimiter(host_interval)
+    connector = aiohttp.TCPConnector(limit=concurrency, ttl_dns_cache=300)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout,
+                                     headers={'User-Agent': USER_AGENT}) as session:
+        async def one(url):
+            try:
+                return url, await fetch_deadline(session, url, cache.get(url, {}), limiter, semaphore)
+            except Exception as e:
+                print(f'Failed to fetch {url}: {e}')
+                return url, None
+        results = await asyncio.gather(*(one(u) for u in urls))
+
+    found_by_url = {}
+    for url, res in results:
+        if res is None:
+            continue
+        found, entry = res
+        cache[url] = entry
+        found_by_url[url] = found
+
+    changes = []
+    for award in awards:
+        found = found_by_url.get(award.get('latestOpeningEntry'))
+        if found and found != award.get('deadline'):
+            changes.append((award.get('name'), award.get('deadline'), found))
+            award['deadline'] = found
+    return changes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Refresh award deadlines in awards.json')
+    parser.add_argument('--awards', default=str(DEFAULT_AWARDS), help='Path to awards.json')
+    parser.add_argument('--cache', default=str(DEFAULT_CACHE), help='Path to the ETag/Last-Modified cache')
+    parser.add_argument('--concurrency', type=int, default=8, help='Maximum requests in flight')
+    parser.add_argument('--host-interval', type=float, default=1.0, help='Minimum seconds between requests to one host')
+    parser.add_argument('--max-age', type=float, default=24, help='Skip pages fetched less than this many hours ago')
+    parser.add_argument('--timeout', type=float, default=20, help='Per-request timeout in seconds')
+    parser.add_argument('--force', action='store_true', help='Fetch every page regardless of --max-age')
+    parser.add_argument('--dry-run', action='store_true', help='Report changes without writing awards.json')
+    args = parser.parse_args(argv)
+
+    if not AIOHTTP_AVAILABLE:
+        print('aiohttp not installed — install it with: pip install aiohttp')
+        return 1
+
+    awards_path, cache_path = Path(args.awards), Path(args.cache)
+    try:
+        awards = json.loads(awards_path.read_text(encoding='utf-8'))
+    except Exception as e:
+        print(f'ERROR: Failed to load JSON {awards_path}: {e}')
+        return 1
+    try:
+        cache = json.loads(cache_path.read_text(encoding='utf-8'))
+    except Exception:
+        cache = {}
+
+    changes = asyncio.run(update_awards(awards, cache, concurrency=args.concurrency, host_interval=args.host_interval,
+                                        max_age_hours=args.max_age, force=args.force, timeout=args.timeout))
+    for name, old, new in changes:
+        print(f'Update {name}: {old} -> {new}')
+
+    if args.dry_run:
+        print(f'Dry run: {len(changes)} deadline(s) would change')
+        return 0
+    atomic_write_json(cache_path, cache)
+    if changes:
+        atomic_write_json(awards_path, awards)
+        print('Updated', awards_path)
+    else:
+        print('No deadlines changed')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
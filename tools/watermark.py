@@ -1,23 +1,16 @@
 import os
 import sys
 import argparse
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw, ImageFont, ImageOps
 
+from atomicio import atomic_save_image
 
-def watermark_images(source_folder, dest_folder, watermark_text, font_path=None, font_size=60):
-    """Apply a semi-transparent watermark to all images in source_folder and write to dest_folder.
-
-    This function uses relative paths by default. Provide explicit paths via CLI if needed.
-    """
-    # Check if source folder exists
-    if not os.path.exists(source_folder):
-        print(f"Source folder does not exist: {source_folder}")
-        return
 
-    # Create destination folder if it doesn't exist
-    os.makedirs(dest_folder, exist_ok=True)
+def load_font(font_path=None, font_size=60):
+    """Load the watermark font, falling back to arial.ttf and then PIL's default font.
 
-    # Load font with fallbacks
+    Returns None if no font could be loaded at all.
+    """
     font = None
     if font_path:
         try:
@@ -36,7 +29,62 @@ def watermark_images(source_folder, dest_folder, watermark_text, font_path=None,
                 print("Using PIL default font as fallback.")
             except Exception as e:
                 print(f"Error loading fallback font: {e}")
-                return
+                return None
+    return font
+
+
+def apply_watermark(img, watermark_text, font):
+    """Return an RGB copy of `img` with the watermark drawn in the bottom right corner.
+
+    Works purely in memory so callers can hand the result straight to the resize/encode stage.
+    """
+    # Convert the image to RGBA if it's not already
+    img = img.convert('RGBA')
+
+    # Create a transparent overlay for the watermark
+    watermark_overlay = Image.new('RGBA', img.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(watermark_overlay)
+
+    # Use textbbox to get the bounding box of the text
+    text_bbox = draw.textbbox((0, 0), watermark_text, font=font)
+    text_width = text_bbox[2] - text_bbox[0]
+    text_height = text_bbox[3] - text_bbox[1]
+
+    # Set position for the watermark (bottom right corner)
+    padding = max(10, int(min(img.size) * 0.02))
+    x = img.size[0] - text_width - padding
+    y = img.size[1] - text_height - padding
+
+    # Draw a subtle outline for the watermark text for visibility
+    outline_range = 1
+    for ox in range(-outline_range, outline_range + 1):
+        for oy in range(-outline_range, outline_range + 1):
+            if ox != 0 or oy != 0:
+                draw.text((x + ox, y + oy), watermark_text, fill=(0, 0, 0, 120), font=font)
+
+    # Draw the main watermark text
+    draw.text((x, y), watermark_text, fill=(255, 255, 255, 140), font=font)
+
+    # Combine the original image with the watermark overlay
+    return Image.alpha_composite(img, watermark_overlay).convert('RGB')
+
+
+def watermark_images(source_folder, dest_folder, watermark_text, font_path=None, font_size=60):
+    """Apply a semi-transparent watermark to all images in source_folder and write to dest_folder.
+
+    This function uses relative paths by default. Provide explicit paths via CLI if needed.
+    """
+    # Check if source folder exists
+    if not os.path.exists(source_folder):
+        print(f"Source folder does not exist: {source_folder}")
+        return
+
+    # Create destination folder if it doesn't exist
+    os.makedirs(dest_folder, exist_ok=True)
+
+    font = load_font(font_path, font_size)
+    if font is None:
+        return
 
     # Loop through all files in the source folder
     for filename in os.listdir(source_folder):
@@ -46,39 +94,12 @@ def watermark_images(source_folder, dest_folder, watermark_text, font_path=None,
             try:
                 # Open the image
                 with Image.open(image_path) as img:
-                    # Convert the image to RGBA if it's not already
-                    img = img.convert('RGBA')
-
-                    # Create a transparent overlay for the watermark
-                    watermark_overlay = Image.new('RGBA', img.size, (0, 0, 0, 0))
-                    draw = ImageDraw.Draw(watermark_overlay)
-
-                    # Use textbbox to get the bounding box of the text
-                    text_bbox = draw.textbbox((0, 0), watermark_text, font=font)
-                    text_width = text_bbox[2] - text_bbox[0]
-                    text_height = text_bbox[3] - text_bbox[1]
-
-                    # Set position for the watermark (bottom right corner)
-                    padding = max(10, int(min(img.size) * 0.02))
-                    x = img.size[0] - text_width - padding
-                    y = img.size[1] - text_height - padding
-
-                    # Draw a subtle outline for the watermark text for visibility
-                    outline_range = 1
-                    for ox in range(-outline_range, outline_range + 1):
-                        for oy in range(-outline_range, outline_range + 1):
-                            if ox != 0 or oy != 0:
-                                draw.text((x + ox, y + oy), watermark_text, fill=(0, 0, 0, 120), font=font)
-
-                    # Draw the main watermark text
-                    draw.text((x, y), watermark_text, fill=(255, 255, 255, 140), font=font)
-
-                    # Combine the original image with the watermark overlay
-                    watermarked_img = Image.alpha_composite(img, watermark_overlay)
+                    # The JPEG is saved without EXIF, so bake the orientation into the pixels
+                    watermarked_img = apply_watermark(ImageOps.exif_transpose(img), watermark_text, font)
 
                     # Save the watermarked image to the destination folder with the original filename
                     dest_path = os.path.join(dest_folder, filename)
-                    watermarked_img.convert('RGB').save(dest_path, 'JPEG')  # Save as JPEG
+                    atomic_save_image(watermarked_img, dest_path, format='JPEG')  # Save as JPEG
 
                     print(f'Watermarked image saved to: {dest_path}')
 
@@ -96,6 +117,10 @@ def parse_args(argv):
     return parser.parse_args(argv)
 
 
+def main(argv=None):
+    args = parse_args(argv)
+    watermark_images(args.source, args.dest, args.text, font_path=args.font, font_size=args.size)
+
+
 if __name__ == '__main__':
-    args = parse_args(sys.argv[1:])
-    watermark_images(args.source, args.dest, args.text, font_path=args.font, font_size=args.size)
\ No newline at end of file
+    main(sys.argv[1:])
\ No newline at end of file